@@ -0,0 +1,116 @@
+import logging
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from authentication.blacklist import token_blacklist
+from core.utils import metrics
+from authentication.tokens import (
+    CLAIMS_AT_CLAIM,
+    IS_ACTIVE_CLAIM,
+    IS_VERIFIED_CLAIM,
+    TENANTS_CLAIM,
+    user_changed_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# Attribute name -> times it was read from the User row rather than a claim.
+_row_reads = {}
+_row_reads_lock = threading.Lock()
+
+
+def _count_row_read(attr):
+    with _row_reads_lock:
+        first = attr not in _row_reads
+        _row_reads[attr] = _row_reads.get(attr, 0) + 1
+    if first:
+        logger.warning(
+            "request.user.%s is not a token claim; reading it loads the user from the database", attr
+        )
+
+
+def row_read_metrics():
+    with _row_reads_lock:
+        return dict(_row_reads)
+
+
+metrics.register("token_user_row_reads", row_read_metrics)
+
+
+class TenantTokenUser(TokenUser):
+    """
+    Request user built from the claims of a TenantRefreshToken.
+
+    Attributes that are not claims come from the ``authentication.User`` row,
+    which is only loaded the first time one of them is needed. Such reads
+    undo the point of stateless authentication, so they are counted per
+    attribute (see /api/metrics/) and the first of each is logged.
+    """
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    @cached_property
+    def is_active(self):
+        return self.token.get(IS_ACTIVE_CLAIM, True)
+
+    @cached_property
+    def is_verified(self):
+        return self.token.get(IS_VERIFIED_CLAIM, False)
+
+    @cached_property
+    def tenant_ids(self):
+        return frozenset(self.token.get(TENANTS_CLAIM, ()))
+
+    def __getattr__(self, attr):
+        token = self.__dict__.get("token")
+        if token is None or attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr in token:
+            return token[attr]
+        _count_row_read(attr)
+        return getattr(self.instance, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates access tokens without loading the user from the database.
+
+    The token is checked against the blacklist (authentication.blacklist),
+    and one cache read tells whether the user changed since its claims were
+    issued. Tokens without claims, or with outdated ones, and all tokens
+    while the cache is down fall back to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if token_blacklist.contains(jti):
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        try:
+            changed_at = cache.get(user_changed_key(user_id))
+        except Exception:
+            logger.warning("User change markers unavailable, loading user %s", user_id, exc_info=True)
+            return super().get_user(validated_token)
+
+        claims_at = validated_token.get(CLAIMS_AT_CLAIM)
+        if claims_at is None or user_id is None or (changed_at is not None and claims_at < changed_at):
+            return super().get_user(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+def get_user_instance(user):
+    """Returns the ``authentication.User`` row behind a request user."""
+    return user.instance if isinstance(user, TenantTokenUser) else user
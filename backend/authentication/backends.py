@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from authentication.hashing import password_hash_pool
+
+
+class PooledPasswordBackend(ModelBackend):
+    """ModelBackend that verifies passwords in the password hash pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so response time does not reveal unknown emails.
+            password_hash_pool.make_password(password)
+            return None
+        if password_hash_pool.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
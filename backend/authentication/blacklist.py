@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+logger = logging.getLogger(__name__)
+
+
+def deny_list_key(jti):
+    return f"auth:deny:{jti}"
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+class TokenBlacklist:
+    """
+    Blacklist of token jtis kept in the shared cache, each entry expiring
+    with the token it blocks.
+
+    Rows in the token_blacklist tables are still honoured: a per-process
+    Bloom filter over their jtis answers "not blacklisted" without a query,
+    and only possible hits reach the database. While the cache is
+    unavailable, jtis are blacklisted in and checked against those tables
+    instead; other processes see such rows once their filter is rebuilt,
+    at most ``rebuild_interval`` seconds later.
+    """
+
+    def __init__(self, error_rate=0.01, rebuild_interval=300):
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._legacy = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def add(self, jti, exp):
+        timeout = int(exp - time.time())
+        if timeout <= 0:
+            return
+        try:
+            cache.set(deny_list_key(jti), 1, timeout)
+        except Exception:
+            logger.warning("Token deny list unavailable, blacklisting %s in the database", jti, exc_info=True)
+            self._add_to_database(jti, exp)
+
+    def contains(self, jti):
+        try:
+            if cache.get(deny_list_key(jti)):
+                return True
+        except Exception:
+            logger.warning("Token deny list unavailable, checking %s in the database", jti, exc_info=True)
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+        legacy = self.legacy_filter()
+        if legacy is None or jti not in legacy:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def _add_to_database(self, jti, exp):
+        token, _ = OutstandingToken.objects.get_or_create(
+            jti=jti, defaults={"token": "", "expires_at": datetime_from_epoch(exp)}
+        )
+        BlacklistedToken.objects.get_or_create(token=token)
+        with self._lock:
+            # Make this process see it right away; others on their next rebuild.
+            self._legacy = None
+
+    def legacy_filter(self):
+        if self._legacy is None or time.monotonic() - self._built_at > self.rebuild_interval:
+            with self._lock:
+                if self._legacy is None or time.monotonic() - self._built_at > self.rebuild_interval:
+                    self._legacy = self._build_legacy_filter()
+                    self._built_at = time.monotonic()
+        return self._legacy or None
+
+    def _build_legacy_filter(self):
+        jtis = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow()).values_list(
+            "token__jti", flat=True
+        )
+        jtis = list(jtis.iterator())
+        if not jtis:
+            return False
+        bloom = BloomFilter(len(jtis), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        return bloom
+
+
+token_blacklist = TokenBlacklist(
+    error_rate=getattr(settings, "TOKEN_BLACKLIST_BLOOM_ERROR_RATE", 0.01),
+    rebuild_interval=getattr(settings, "TOKEN_BLACKLIST_BLOOM_REBUILD_INTERVAL", 300),
+)
+
+
+def deny_token(token):
+    """
+    Rejects ``token`` until it expires. Entries live only as long as the token
+    they deny, so the list stays small.
+    """
+    token_blacklist.add(token[api_settings.JTI_CLAIM], token["exp"])
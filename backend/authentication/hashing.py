@@ -0,0 +1,152 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.utils import metrics
+from core.utils.metrics import Counter, Summary
+
+
+class PasswordHashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many requests, try again shortly.'
+    default_code = 'password_hashing_unavailable'
+
+    def __init__(self, wait):
+        super().__init__()
+        # DRF's exception handler turns this into a Retry-After header.
+        self.wait = wait
+
+
+def _timed(func, *args):
+    started_at = time.time()
+    result = func(*args)
+    return result, started_at, time.time()
+
+
+def _make_password(raw_password):
+    return _timed(make_password, raw_password)
+
+
+def _verify_password(raw_password, encoded):
+    must_update = []
+    is_correct = check_password(raw_password, encoded, setter=lambda raw: must_update.append(True))
+    return is_correct, bool(must_update)
+
+
+def _check_password(raw_password, encoded):
+    return _timed(_verify_password, raw_password, encoded)
+
+
+class PasswordHashPool:
+    """
+    Runs password hashing and verification in a bounded process pool so that
+    PBKDF2 does not pin request workers.
+
+    At most ``workers + queue_depth`` jobs are in flight; beyond that requests
+    are shed with PasswordHashingUnavailable (503, Retry-After). With
+    ``workers=0`` hashing runs inline. If a child process dies, the pool is
+    replaced and the job retried once.
+    """
+
+    def __init__(self, workers=2, queue_depth=8, retry_after=1):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        self.hash_latency = Summary()
+        self.queue_wait = Summary()
+        self.rejected = Counter()
+        self.restarts = Counter()
+        self._slots = threading.BoundedSemaphore(workers + queue_depth) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Created lazily so each gunicorn worker gets its own pool after fork.
+        # Spawned children start clean instead of inheriting DB connections.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=django.setup,
+                    )
+        return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            result, started_at, finished_at = func(*args)
+            self.hash_latency.observe(finished_at - started_at)
+            return result
+
+        if not self._slots.acquire(blocking=False):
+            self.rejected.inc()
+            raise PasswordHashingUnavailable(wait=self.retry_after)
+        try:
+            submitted_at = time.time()
+            try:
+                result, started_at, finished_at = self._submit(func, *args)
+            except BrokenProcessPool:
+                raise PasswordHashingUnavailable(wait=self.retry_after)
+        finally:
+            self._slots.release()
+        self.queue_wait.observe(max(started_at - submitted_at, 0.0))
+        self.hash_latency.observe(finished_at - started_at)
+        return result
+
+    def _submit(self, func, *args):
+        executor = self.executor
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A child died (e.g. OOM-killed) and the executor now refuses all
+            # work; replace it so later logins don't fail until a restart.
+            self._replace_executor(executor)
+            return self.executor.submit(func, *args).result()
+
+    def _replace_executor(self, broken):
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        self.restarts.inc()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def make_password(self, raw_password):
+        return self._run(_make_password, raw_password)
+
+    def check_password(self, user, raw_password):
+        """
+        Pooled equivalent of ``user.check_password()``, including the rehash
+        when the stored hash uses outdated parameters.
+        """
+        is_correct, must_update = self._run(_check_password, raw_password, user.password)
+        if must_update:
+            user.password = self.make_password(raw_password)
+            user.save(update_fields=['password'])
+        return is_correct
+
+    def metrics(self):
+        return {
+            'hash_latency': self.hash_latency.snapshot(),
+            'queue_wait': self.queue_wait.snapshot(),
+            'rejected': self.rejected.value,
+            'restarts': self.restarts.value,
+        }
+
+
+password_hash_pool = PasswordHashPool(
+    workers=getattr(settings, 'PASSWORD_HASH_POOL_WORKERS', 2),
+    queue_depth=getattr(settings, 'PASSWORD_HASH_POOL_QUEUE_DEPTH', 8),
+    retry_after=getattr(settings, 'PASSWORD_HASH_RETRY_AFTER', 1),
+)
+metrics.register('password_hashing', password_hash_pool.metrics)
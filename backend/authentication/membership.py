@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from authentication.models import User
+from core.utils.cache import TwoTierCache
+
+membership_cache = TwoTierCache(
+    "auth:tenant-ids",
+    maxsize=getattr(settings, "MEMBERSHIP_CACHE_LOCAL_MAXSIZE", 4096),
+    local_ttl=getattr(settings, "MEMBERSHIP_CACHE_LOCAL_TTL", 30),
+    shared_ttl=getattr(settings, "MEMBERSHIP_CACHE_TTL", 300),
+)
+
+
+def _load_tenant_ids(user_id):
+    return frozenset(
+        User.tenant.through.objects.filter(user_id=user_id).values_list("tenant_id", flat=True)
+    )
+
+
+def get_tenant_ids(user_id):
+    """Ids of the tenants the user belongs to, cached per user."""
+    user_id = str(user_id)
+    return membership_cache.get_or_load(user_id, lambda: _load_tenant_ids(user_id))
+
+
+def is_tenant_member(user_id, tenant_id):
+    return tenant_id in get_tenant_ids(user_id)
+
+
+def invalidate_memberships(user_id):
+    membership_cache.delete(str(user_id))
@@ -6,7 +6,8 @@ from django.contrib.auth.models import (
 
 from django.db import models, transaction
 from django.utils import timezone
-from rest_framework_simplejwt.tokens import RefreshToken
+from authentication.hashing import password_hash_pool
+from authentication.tokens import issue_tokens
 import random
 import uuid
 from django_tenants.utils import schema_context
@@ -30,7 +31,7 @@ class UserManager(BaseUserManager):
         user.last_name = last_name
         user.middle_name = middle_name
 
-        user.set_password(password)
+        user.password = password_hash_pool.make_password(password)
         user.save()
         return user
 
@@ -66,19 +67,22 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
     def tokens(self):
-        refresh = RefreshToken.for_user(self)
-        return {
-            'refresh': str(refresh),
-            'access': str(refresh.access_token)
-        }
+        return issue_tokens(self)
 
     def has_tenant_role(self, tenant_schema, role_name):
-        with schema_context(tenant_schema):
-            return self.user_roles.filter(roles__name=role_name).exists()
+        from tenant_permissions.matrix import get_snapshot
+        return role_name in get_snapshot(tenant_schema, self.pk).roles
 
     def has_tenant_permission(self, tenant_schema, permission_codename):
-        with schema_context(tenant_schema):
-            return (
-                self.user_roles.filter(roles__permissions__codename=permission_codename).exists() or
-                self.user_permissions.filter(permissions__codename=permission_codename).exists()
-            )
+        from tenant_permissions.matrix import get_snapshot
+        return permission_codename in get_snapshot(tenant_schema, self.pk).permissions
+
+    def get_tenant_permissions(self, tenant_schemas=None, roles=None, permissions=None):
+        """
+        Roles and permission codenames the user has in each tenant, in bulk.
+        Defaults to every tenant the user belongs to.
+        """
+        from tenant_permissions.matrix import evaluate
+        if tenant_schemas is None:
+            tenant_schemas = self.tenant.values_list('schema_name', flat=True)
+        return evaluate(self.pk, list(tenant_schemas), roles=roles, permissions=permissions)
@@ -0,0 +1,81 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+logger = logging.getLogger(__name__)
+
+
+class OutstandingTokenWriter:
+    """
+    Buffers OutstandingToken rows and inserts them with bulk_create.
+
+    The buffer is flushed when it reaches ``batch_size`` rows, and otherwise by
+    a daemon thread every ``flush_interval`` seconds and at exit. Losing an
+    unflushed row is harmless: RefreshToken.blacklist() creates the
+    outstanding row it needs on demand.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, user_id, token):
+        row = OutstandingToken(
+            user_id=user_id,
+            jti=token[api_settings.JTI_CLAIM],
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token["exp"]),
+        )
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+        if full:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        try:
+            OutstandingToken.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+        except Exception:
+            logger.exception("Failed to write %d outstanding tokens", len(rows))
+            return 0
+        return len(rows)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name="outstanding-token-writer", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+
+outstanding_token_writer = OutstandingTokenWriter(
+    batch_size=getattr(settings, "OUTSTANDING_TOKEN_BATCH_SIZE", 100),
+    flush_interval=getattr(settings, "OUTSTANDING_TOKEN_FLUSH_INTERVAL", 2.0),
+)
+atexit.register(outstanding_token_writer.flush)
@@ -8,11 +8,15 @@ from django.contrib import auth
 
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 from rest_framework.exceptions import ValidationError
 
 from tenants.models import Tenant
+from authentication.hashing import PasswordHashingUnavailable, password_hash_pool
 from authentication.models import User
+from authentication.tokens import TenantRefreshToken
 from tenants.serializers import TenantSerializer
 from core import settings
 
@@ -48,6 +52,8 @@ class CreateAccountSerializer(serializers.Serializer):
             )
         except TypeError as e:
             raise ValidationError({"detail": str(e)})
+        except PasswordHashingUnavailable:
+            raise
         except Exception as e:
             raise ValidationError({"detail": "An error occurred while processing the invitation."})
 
@@ -63,23 +69,16 @@ class LoginSerializer(serializers.ModelSerializer):
 
 
     def get_tokens(self, obj) -> dict:
-        # Handle the case when `obj` is a dictionary (during validation)
+        # Handle the case when `obj` is a dictionary (the validated data, whose
+        # tokens were minted once in validate())
         if isinstance(obj, dict):
-            try:
-                user = User.objects.get(email=obj.get('email'))
-            except ObjectDoesNotExist:
-                return {
-                    'refresh': None,
-                    'access': None
-                }
-        else:
-            # Handle the case when `obj` is a User instance
-            user = obj
+            return obj.get('tokens') or {
+                'refresh': None,
+                'access': None
+            }
 
-        return {
-            'refresh': user.tokens()['refresh'],
-            'access': user.tokens()['access']
-        }
+        # Handle the case when `obj` is a User instance
+        return obj.tokens()
 
     class Meta:
         model = User
@@ -122,11 +121,38 @@ class LogoutSerializer(serializers.Serializer):
     def save(self, **kwargs):
 
         try:
-            RefreshToken(self.token).blacklist()
+            TenantRefreshToken(self.token).blacklist()
 
         except TokenError:
             self.fail('bad_token')
 
+class TenantTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = TenantRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first() if user_id else None
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        # The claims copied into the new tokens are read again here, so a
+        # change the user-changed marker has expired for can't resurface.
+        refresh.set_claims(user)
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+
+        return data
+
 class ResetPasswordEmailRequestSerializer(serializers.Serializer):
     email = serializers.EmailField(min_length=2)
 
@@ -157,10 +183,12 @@ class SetNewPasswordSerializer(serializers.Serializer):
             if not PasswordResetTokenGenerator().check_token(user, token):
                 raise AuthenticationFailed('The reset link is invalid', 401)
 
-            user.set_password(password)
+            user.password = password_hash_pool.make_password(password)
             user.save()
 
             return (user)
+        except PasswordHashingUnavailable:
+            raise
         except Exception as e:
             raise AuthenticationFailed('The reset link is invalid', 401)
         return super().validate(attrs)
@@ -0,0 +1,29 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from authentication.membership import invalidate_memberships
+from authentication.models import User
+from authentication.tokens import mark_user_changed
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    mark_user_changed(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.tenant.through)
+def user_tenants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_user_ids = list(instance.user_set.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == "post_clear":
+        user_ids = getattr(instance, "_cleared_user_ids", [])
+    else:
+        user_ids = pk_set or []
+    for user_id in user_ids:
+        invalidate_memberships(user_id)
+        mark_user_changed(user_id)
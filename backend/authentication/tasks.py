@@ -1,4 +1,7 @@
 from celery import shared_task
+from django.conf import settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
 from .utils import Util
 from datetime import datetime
 
@@ -34,4 +37,24 @@ def send_password_reset_email(data):
     - button_text
     - information_message
     """
-    Util.send_email(data)
\ No newline at end of file
+    Util.send_email(data)
+
+
+@shared_task
+def prune_expired_tokens():
+    """
+    Deletes expired outstanding tokens, and with them their blacklist rows,
+    a chunk at a time so no single statement holds locks for long.
+    """
+    chunk_size = getattr(settings, 'TOKEN_PRUNE_CHUNK_SIZE', 1000)
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=aware_utcnow())
+            .order_by('id')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return deleted
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
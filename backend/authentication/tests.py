@@ -1,3 +1,253 @@
-from django.test import TestCase
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from authentication.authentication import StatelessJWTAuthentication, TenantTokenUser, row_read_metrics
+from authentication.blacklist import TokenBlacklist, deny_token
+from authentication.hashing import PasswordHashingUnavailable, PasswordHashPool
+from authentication.membership import is_tenant_member
+from authentication.models import User
+from authentication.outstanding import OutstandingTokenWriter
+from authentication.serializers import TenantTokenRefreshSerializer
+from authentication.tasks import prune_expired_tokens
+from authentication.tokens import TENANTS_CLAIM, TenantRefreshToken, mark_user_changed
+from core.testing import LOCMEM_CACHE
+from core.utils import metrics
+from tenants.models import Tenant
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CreateAccountTests(TestCase):
+    @mock.patch("authentication.views.send_verification_email")
+    async def test_signup_through_the_async_stack(self, send_verification_email):
+        response = await self.async_client.post(
+            "/api/auth/create-account/",
+            {
+                "email": "new@example.com",
+                "password": "a-long-password-1",
+                "first_name": "New",
+                "last_name": "User",
+                "middle_name": "",
+                "redirect_url": "https://app.example.com/verified",
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        user = await User.objects.aget(email="new@example.com")
+        url = send_verification_email.delay.call_args.args[0]["confirmation_url"]
+        token = AccessToken(parse_qs(urlparse(url).query)["token"][0])
+        self.assertEqual(token["user_id"], str(user.pk))
+        self.assertFalse(await OutstandingToken.objects.filter(user=user).aexists())
+
+    @mock.patch("authentication.views.send_password_reset_email")
+    async def test_password_reset_through_the_async_stack(self, send_password_reset_email):
+        await User.objects.acreate(email="forgetful@example.com", first_name="For", last_name="Getful")
+        response = await self.async_client.post(
+            "/api/auth/request-reset-email/",
+            {"email": "forgetful@example.com", "redirect_url": "https://app.example.com/reset"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        url = send_password_reset_email.delay.call_args.args[0]["confirmation_url"]
+        self.assertTrue(url.startswith("http://testserver/api/auth/password-reset/"))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TokenClaimsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            email="member@example.com", first_name="Mem", last_name="Ber", is_verified=True
+        )
+        self.tenant = Tenant(schema_name="claims", name="Claims", admin_email="admin@example.com")
+        self.tenant.auto_create_schema = False
+        self.tenant.save()
+        self.user.tenant.add(self.tenant)
+
+    def test_refresh_rereads_memberships(self):
+        refresh = TenantRefreshToken.for_user(self.user)
+        self.assertEqual(refresh[TENANTS_CLAIM], [self.tenant.pk])
+
+        self.user.tenant.remove(self.tenant)
+        # The user-changed marker only outlives access tokens.
+        cache.clear()
+
+        serializer = TenantTokenRefreshSerializer(data={"refresh": str(refresh)})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(AccessToken(serializer.validated_data["access"])[TENANTS_CLAIM], [])
+        self.assertEqual(TenantRefreshToken(serializer.validated_data["refresh"])[TENANTS_CLAIM], [])
+
+
+class MarkUserChangedTests(SimpleTestCase):
+    def test_cache_errors_are_raised(self):
+        with mock.patch("authentication.tokens.cache.set", side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                mark_user_changed("c0ffee")
+
+
+class TokenBlacklistOutageTests(TestCase):
+    def test_falls_back_to_the_database_while_the_cache_is_down(self):
+        blacklist = TokenBlacklist()
+        with mock.patch("authentication.blacklist.cache") as broken_cache:
+            broken_cache.get.side_effect = broken_cache.set.side_effect = ConnectionError
+            self.assertFalse(blacklist.contains("jti-1"))
+            blacklist.add("jti-1", time.time() + 60)
+            self.assertTrue(blacklist.contains("jti-1"))
+            self.assertFalse(blacklist.contains("jti-2"))
+
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    @mock.patch("authentication.tokens.outstanding_token_writer")
+    def test_token_revoked_during_an_outage_stays_revoked(self, _):
+        cache.clear()
+        user = User.objects.create(email="leaver@example.com", first_name="Lea", last_name="Ver")
+        access = TenantRefreshToken.for_user(user).access_token
+        authentication = StatelessJWTAuthentication()
+        with (
+            mock.patch("authentication.blacklist.cache.set", side_effect=ConnectionError),
+            mock.patch("authentication.blacklist.cache.get", side_effect=ConnectionError),
+            mock.patch("authentication.authentication.cache.get", side_effect=ConnectionError),
+        ):
+            deny_token(access)
+            with self.assertRaises(AuthenticationFailed):
+                authentication.get_user(access)
+
+        # Redis is back, without the entry that could not be written to it.
+        with self.assertRaises(AuthenticationFailed):
+            authentication.get_user(access)
+        self.assertEqual(authentication.get_user(TenantRefreshToken.for_user(user).access_token).pk, str(user.pk))
+
+
+class PasswordHashPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("authentication.hashing.ProcessPoolExecutor")
+        self.executor_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = PasswordHashPool(workers=1, queue_depth=0)
+
+    def executor(self, *outcomes):
+        executor = mock.Mock()
+        executor.submit.return_value.result.side_effect = outcomes
+        return executor
+
+    def test_broken_executor_is_replaced(self):
+        broken = self.executor(BrokenProcessPool())
+        self.executor_class.side_effect = [broken, self.executor(("hash", 1.0, 1.5))]
+
+        self.assertEqual(self.pool.make_password("secret"), "hash")
+        broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        self.assertEqual(self.pool.metrics()["restarts"], 1)
+        self.assertEqual(self.pool.metrics()["hash_latency"]["count"], 1)
+
+    def test_repeated_breakage_is_unavailable_not_an_error(self):
+        self.executor_class.side_effect = [self.executor(BrokenProcessPool()), self.executor(BrokenProcessPool())]
+        with self.assertRaises(PasswordHashingUnavailable):
+            self.pool.make_password("secret")
+        # The slot is released again.
+        self.assertTrue(self.pool._slots.acquire(blocking=False))
+
+    def test_rejections_are_counted_and_reported(self):
+        self.pool._slots.acquire()
+        with self.assertRaises(PasswordHashingUnavailable):
+            self.pool.make_password("secret")
+        self.assertEqual(self.pool.metrics()["rejected"], 1)
+
+        with mock.patch.dict(metrics._sources, {"password_hashing": self.pool.metrics}):
+            self.assertEqual(metrics.collect()["password_hashing"]["rejected"], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TenantMembershipTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="joiner@example.com", first_name="Jo", last_name="Iner")
+        self.tenant = Tenant(schema_name="members", name="Members", admin_email="admin@example.com")
+        self.tenant.auto_create_schema = False
+        self.tenant.save()
+
+    def test_joining_and_leaving_is_seen_despite_the_cache(self):
+        self.assertFalse(is_tenant_member(self.user.pk, self.tenant.pk))
+        self.user.tenant.add(self.tenant)
+        self.assertTrue(is_tenant_member(self.user.pk, self.tenant.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_tenant_member(self.user.pk, self.tenant.pk))
+        self.tenant.user_set.clear()
+        self.assertFalse(is_tenant_member(self.user.pk, self.tenant.pk))
+
+
+class OutstandingTokenWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.writer = OutstandingTokenWriter(batch_size=3, flush_interval=3600)
+        self.writer._ensure_flusher = lambda: None
+        patcher = mock.patch("authentication.outstanding.OutstandingToken.objects.bulk_create")
+        self.bulk_create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rows_are_written_in_batches(self):
+        tokens = [RefreshToken() for _ in range(4)]
+        for token in tokens:
+            self.writer.add("c0ffee", token)
+
+        self.bulk_create.assert_called_once()
+        rows = self.bulk_create.call_args.args[0]
+        self.assertEqual([row.jti for row in rows], [token["jti"] for token in tokens[:3]])
+        self.assertTrue(self.bulk_create.call_args.kwargs["ignore_conflicts"])
+
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_write_errors_do_not_reach_the_login(self):
+        self.bulk_create.side_effect = ConnectionError
+        with self.assertLogs("authentication.outstanding", "ERROR"):
+            for _ in range(3):
+                self.writer.add("c0ffee", RefreshToken())
+
+
+@override_settings(TOKEN_PRUNE_CHUNK_SIZE=2)
+class PruneExpiredTokensTests(TestCase):
+    def token(self, jti, expires_in, blacklisted=False):
+        token = OutstandingToken.objects.create(
+            jti=jti, token="", expires_at=timezone.now() + timedelta(seconds=expires_in)
+        )
+        if blacklisted:
+            BlacklistedToken.objects.create(token=token)
+        return token
+
+    def test_only_expired_tokens_are_removed(self):
+        for i in range(3):
+            self.token(f"expired-{i}", -60, blacklisted=i == 0)
+        self.token("live", 3600)
+        self.token("revoked", 3600, blacklisted=True)
+
+        self.assertEqual(prune_expired_tokens(), 3)
+
+        self.assertEqual(set(OutstandingToken.objects.values_list("jti", flat=True)), {"live", "revoked"})
+        self.assertEqual(list(BlacklistedToken.objects.values_list("token__jti", flat=True)), ["revoked"])
+
+
+class TenantTokenUserTests(SimpleTestCase):
+    def test_reads_beyond_the_claims_are_counted(self):
+        token = AccessToken()
+        token["user_id"] = "c0ffee"
+        token["email"] = "member@example.com"
+        user = TenantTokenUser(token)
+        before = row_read_metrics().get("first_name", 0)
+
+        with mock.patch("authentication.authentication.get_user_model") as get_user_model:
+            get_user_model.return_value.objects.get.return_value.first_name = "Mem"
+            self.assertEqual(user.email, "member@example.com")
+            self.assertEqual(user.first_name, "Mem")
+
+        self.assertEqual(row_read_metrics()["first_name"], before + 1)
+        self.assertNotIn("email", row_read_metrics())
@@ -0,0 +1,81 @@
+import time
+
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from authentication.blacklist import token_blacklist
+from authentication.outstanding import outstanding_token_writer
+
+
+# Custom claims carried by access tokens so requests can be authenticated
+# without loading the user row. CLAIMS_AT records when they were read from
+# the database, which happens again on every refresh.
+IS_ACTIVE_CLAIM = "is_active"
+IS_VERIFIED_CLAIM = "is_verified"
+IS_STAFF_CLAIM = "is_staff"
+IS_SUPERUSER_CLAIM = "is_superuser"
+EMAIL_CLAIM = "email"
+TENANTS_CLAIM = "tenants"
+CLAIMS_AT_CLAIM = "claims_at"
+
+
+def user_changed_key(user_id):
+    return f"auth:user-changed:{user_id}"
+
+
+class TenantRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        # Skip BlacklistMixin.for_user, which inserts the OutstandingToken row
+        # inline; the row is queued with the claims included instead.
+        token = super(BlacklistMixin, cls).for_user(user)
+        token.set_claims(user)
+        outstanding_token_writer.add(user.pk, token)
+        return token
+
+    def set_claims(self, user):
+        """(Re)reads the user's claims from ``user``, e.g. when refreshing."""
+        self[EMAIL_CLAIM] = user.email
+        self[IS_ACTIVE_CLAIM] = user.is_active
+        self[IS_VERIFIED_CLAIM] = user.is_verified
+        self[IS_STAFF_CLAIM] = user.is_staff
+        self[IS_SUPERUSER_CLAIM] = user.is_superuser
+        self[TENANTS_CLAIM] = list(user.tenant.values_list("pk", flat=True))
+        self[CLAIMS_AT_CLAIM] = time.time()
+
+    # The blacklist lives in the shared cache (authentication.blacklist)
+    # rather than the token_blacklist tables.
+    def check_blacklist(self):
+        if token_blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        token_blacklist.add(self.payload[api_settings.JTI_CLAIM], self.payload["exp"])
+
+    def outstand(self):
+        outstanding_token_writer.add(self.payload.get(api_settings.USER_ID_CLAIM), self)
+
+
+def issue_tokens(user):
+    """Mints one refresh/access pair for ``user``."""
+    refresh = TenantRefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+def mark_user_changed(user_id):
+    """
+    Invalidates the claims of every access token issued to the user so far.
+    Such tokens stay valid but are authenticated against the database again.
+
+    Refreshing re-reads the claims (TenantTokenRefreshSerializer), so only
+    access tokens carry claims from before the change, and the marker only
+    has to outlive them. Errors are raised: a change that can't be marked
+    must not be saved, or tokens would keep its old claims.
+    """
+    timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+    cache.set(user_changed_key(user_id), time.time(), timeout)
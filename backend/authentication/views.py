@@ -9,11 +9,13 @@ from django.http import HttpResponseRedirect
 from django.conf import settings
 
 
+from adrf import generics as async_generics
+from asgiref.sync import sync_to_async
 from rest_framework.generics import CreateAPIView, GenericAPIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken
 import jwt
 
 from authentication.models import User
@@ -27,7 +29,8 @@ from authentication.serializers import(
     EmailVerificationSerializer,
 )
 
-from authentication.tasks import send_verification_email
+from authentication.blacklist import deny_token
+from authentication.tasks import send_password_reset_email, send_verification_email
 
 
 
@@ -46,21 +49,30 @@ class CheckAccountExistenceAPIView(CreateAPIView):
             return Response({"message":"Account Not Found"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CreateAccountAPIView(CreateAPIView):
+class CreateAccountAPIView(async_generics.CreateAPIView):
     serializer_class = CreateAccountSerializer
     permission_classes = (permissions.AllowAny,)
-    def post(self, request, *args, **kwargs):
+
+    @staticmethod
+    def verification_url(request, user, redirect_url):
+        # VerifyEmail only needs an access token; unlike RefreshToken.for_user
+        # this writes no OutstandingToken row, so nothing here queries and it
+        # is safe on the event loop. django.contrib.sites is not installed, so
+        # get_current_site() returns a RequestSite built from the Host header.
+        token = AccessToken.for_user(user)
+        current_site = get_current_site(request).domain
+        relativeLink = reverse('email-verify')
+        return 'http://'+current_site+relativeLink+"?token="+str(token)+"&redirect_url="+redirect_url
+
+    async def post(self, request, *args, **kwargs):
         serializer = CreateAccountSerializer(data=request.data)
         redirect_url = request.data.get('redirect_url', '')
 
 
-        if serializer.is_valid():
-            user = serializer.save()
+        if await sync_to_async(serializer.is_valid)():
+            user = await sync_to_async(serializer.save)()
             if user:
-                token = RefreshToken.for_user(user).access_token
-                current_site = get_current_site(request).domain
-                relativeLink = reverse('email-verify')
-                complete_url = 'http://'+current_site+relativeLink+"?token="+str(token)+"&redirect_url="+redirect_url
+                complete_url = self.verification_url(request, user, redirect_url)
                 data = {'to_email': user.email,
                         'email_subject': 'Verify Your Email',
                         'title': 'Verify Your Email',
@@ -70,7 +82,7 @@ class CreateAccountAPIView(CreateAPIView):
                         'button_text': 'Complete Registration',
                         'information_message': 'Button not working? Copy and paste this link into your browser',
                         }
-                send_verification_email.delay(data)
+                await sync_to_async(send_verification_email.delay)(data)
 
                 return Response({"message":"Registered Account"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -100,7 +112,8 @@ class VerifyEmail(GenericAPIView):
                 user.save()
             
             if redirect_url:
-                return CustomRedirect(f"{redirect_url}?access_token={user.tokens()['access']}&refresh_token={user.tokens()['refresh']}")
+                tokens = user.tokens()
+                return CustomRedirect(f"{redirect_url}?access_token={tokens['access']}&refresh_token={tokens['refresh']}")
             else:
                 return Response({'email': 'Successfully activated'}, status=status.HTTP_200_OK)
         except jwt.ExpiredSignatureError as identifier:
@@ -125,21 +138,23 @@ class LogoutAPIView(GenericAPIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        deny_token(request.auth)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class RequestPasswordResetEmail(GenericAPIView):
+class RequestPasswordResetEmail(async_generics.GenericAPIView):
     serializer_class = ResetPasswordEmailRequestSerializer
     permission_classes = (permissions.AllowAny,)
 
-    def post(self, request):
+    async def post(self, request):
         serializer = self.serializer_class(data=request.data)
 
         email = request.data.get('email', '')
 
-        if User.objects.filter(email=email).exists():
-            user = User.objects.get(email=email)
+        user = await User.objects.filter(email=email).afirst()
+        if user:
             uidb64 = urlsafe_base64_encode(smart_bytes(user.id))
             token = PasswordResetTokenGenerator().make_token(user)
+            # A RequestSite, without a query; see CreateAccountAPIView.verification_url.
             current_site = get_current_site(
                 request=request).domain
             relativeLink = reverse(
@@ -158,7 +173,7 @@ class RequestPasswordResetEmail(GenericAPIView):
                 'button_text': 'Reset Your Password',
                 'information_message': 'Button not working? Copy and paste this link into your browser:',
             }
-            send_password_reset_email.delay(data)
+            await sync_to_async(send_password_reset_email.delay)(data)
         return Response({"message":"We Have Sent you an Email"}, status=status.HTTP_200_OK)
 
 class PasswordTokenCheckAPI(GenericAPIView):
@@ -196,11 +211,11 @@ class PasswordTokenCheckAPI(GenericAPIView):
             except UnboundLocalError as e:
                 return CustomRedirect(redirect_url + '?token_valid=False')
 
-class SetNewPasswordAPIView(GenericAPIView):
+class SetNewPasswordAPIView(async_generics.GenericAPIView):
     serializer_class = SetNewPasswordSerializer
     permission_classes = (permissions.AllowAny,)
 
-    def patch(self, request):
+    async def patch(self, request):
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
         return Response({'success': True, 'message': 'Password reset success'}, status=status.HTTP_200_OK)
@@ -1,4 +1,10 @@
+import hashlib
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import DisallowedHost
 from django.http import HttpResponseNotFound, Http404, JsonResponse
 from django.db import connection
@@ -10,41 +16,125 @@ from django_tenants.utils import (
     has_multi_type_tenants,
     remove_www,
 )
-from tenants.models import Tenant
+from core.routers import ReplicaState, replica_alias, replica_state
+from tenants.cache import aget_tenant_by_schema, get_tenant_by_schema
+from tenants.domains import domain_index
+from tenants.limits import retry_after_header, tenant_limiter
+from tenants.models import StatusChoices
+from tenants.usage import db_time, usage_meter
 from django.http import HttpResponse
 
 class TenantMainMiddleware:
     TENANT_NOT_FOUND_EXCEPTION = Http404
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     @staticmethod
     def hostname_from_request(request):
         return remove_www(request.get_host().split(":")[0])
 
+    @staticmethod
+    def tenant_name_from_request(request, hostname):
+        """
+        The X-Tenant-ID header wins; otherwise the hostname is looked up in the
+        in-memory Domain index, falling back to the public schema.
+        """
+        tenant_name = request.headers.get("X-Tenant-ID")
+        if tenant_name is None:
+            tenant_name = domain_index.lookup(hostname) or get_public_schema_name()
+        return tenant_name.lower()
+
     def __call__(self, request):
-        connection.set_schema_to_public()
+        if self.async_mode:
+            return self.__acall__(request)
+
         try:
             hostname = self.hostname_from_request(request)
         except DisallowedHost:
+            connection.set_schema_to_public()
             return HttpResponseNotFound()
 
-        tenant_name = request.headers.get("X-Tenant-ID", "public").lower()
+        domain_index.ensure_fresh()
+        tenant_name = self.tenant_name_from_request(request, hostname)
+        tenant = get_tenant_by_schema(tenant_name)
+        response = self.activate_tenant(request, hostname, tenant_name, tenant)
+        if response is not None:
+            return response
+        slot, retry_after = self.acquire_limits(tenant)
+        if retry_after is not None:
+            return self.too_many_requests(retry_after)
+        try:
+            return self.get_response(request)
+        finally:
+            tenant_limiter.release(slot)
 
+    async def __acall__(self, request):
         try:
-            tenant = Tenant.objects.get(schema_name__iexact=tenant_name)
-        except Tenant.DoesNotExist:
+            hostname = self.hostname_from_request(request)
+        except DisallowedHost:
+            await sync_to_async(connection.set_schema_to_public)()
+            return HttpResponseNotFound()
+
+        if domain_index.is_due():
+            await sync_to_async(domain_index.ensure_fresh)()
+        tenant_name = self.tenant_name_from_request(request, hostname)
+        tenant = await aget_tenant_by_schema(tenant_name)
+        # The connection is thread bound; switch it on the thread that runs
+        # this request's sync code and ORM calls.
+        response = await sync_to_async(self.activate_tenant)(request, hostname, tenant_name, tenant)
+        if response is not None:
+            return response
+        slot, retry_after = await sync_to_async(self.acquire_limits)(tenant)
+        if retry_after is not None:
+            return self.too_many_requests(retry_after)
+        try:
+            return await self.get_response(request)
+        finally:
+            if slot is not None:
+                await sync_to_async(tenant_limiter.release)(slot)
+
+    @staticmethod
+    def acquire_limits(tenant):
+        # Per-tenant rate and concurrency limits; see TenantLimiter.
+        if tenant is None or tenant.schema_name == get_public_schema_name():
+            return None, None
+        return tenant_limiter.acquire(tenant)
+
+    @staticmethod
+    def too_many_requests(retry_after):
+        response = JsonResponse({"detail": "Too many requests for this tenant."}, status=429)
+        response["Retry-After"] = retry_after_header(retry_after)
+        return response
+
+    def activate_tenant(self, request, hostname, tenant_name, tenant):
+        """
+        Selects the schema for the request. Returns a response to send instead
+        of calling the view, or None.
+        """
+        # The schema is selected once the tenant is known; the backend only
+        # issues SET search_path when it differs from the connection's current one.
+        if tenant is None:
+            connection.set_schema_to_public()
             if tenant_name != "public":
                 return JsonResponse({"detail": "Tenant not found"}, status=400)
             self.no_tenant_found(request, hostname)
-            return self.get_response(request)
+            return None
+        if tenant.tenant_status == StatusChoices.INACTIVE:
+            # Being torn down; see tenants.teardown.
+            connection.set_schema_to_public()
+            return JsonResponse({"detail": "Tenant not found"}, status=400)
 
         tenant.domain_url = hostname
         request.tenant = tenant
         connection.set_tenant(request.tenant)
         self.setup_url_routing(request)
-        return self.get_response(request)
+        return None
 
     def no_tenant_found(self, request, hostname):
         if (
@@ -73,4 +163,130 @@ class TenantMainMiddleware:
             if hasattr(settings, "PUBLIC_SCHEMA_URLCONF") and (
                 force_public or request.tenant.schema_name == public_schema_name
             ):
-                request.urlconf = settings.PUBLIC_SCHEMA_URLCONF
\ No newline at end of file
+                request.urlconf = settings.PUBLIC_SCHEMA_URLCONF
+
+
+class UsageMiddleware:
+    """
+    Meters each request to a tenant: latency, time spent in SQL (timed by
+    tenants.usage.time_queries) and response size. Recording only updates
+    in-process counters; see UsageMeter.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def response_bytes(response):
+        if response.has_header("Content-Length"):
+            return int(response["Content-Length"])
+        return 0 if response.streaming else len(response.content)
+
+    def record(self, request, response, started, spent):
+        tenant = getattr(request, "tenant", None)
+        if tenant is not None:
+            usage_meter.record(
+                tenant.schema_name, time.perf_counter() - started, spent[0], self.response_bytes(response)
+            )
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started, spent = time.perf_counter(), [0.0]
+        token = db_time.set(spent)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_time.reset(token)
+        self.record(request, response, started, spent)
+        return response
+
+    async def __acall__(self, request):
+        started, spent = time.perf_counter(), [0.0]
+        token = db_time.set(spent)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_time.reset(token)
+        self.record(request, response, started, spent)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Lets ReplicaRouter read from the replica during safe requests to
+    REPLICA_READ_PATHS. After a request writes, the client (its Authorization
+    header, else its session cookie) is pinned to the primary for
+    REPLICA_PIN_SECONDS so it reads its own writes.
+    """
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.read_paths = [re.compile(pattern) for pattern in getattr(settings, "REPLICA_READ_PATHS", ())]
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 10)
+
+    @staticmethod
+    def pin_key(request):
+        client = request.headers.get("Authorization") or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not client:
+            return None
+        return "db:pin:" + hashlib.sha256(client.encode()).hexdigest()
+
+    def wants_replica(self, request):
+        return (
+            replica_alias() is not None
+            and request.method in self.SAFE_METHODS
+            and any(pattern.match(request.path) for pattern in self.read_paths)
+        )
+
+    def is_pinned(self, request):
+        key = self.pin_key(request)
+        return bool(key and cache.get(key))
+
+    def needs_pin(self, request, state):
+        return replica_alias() is not None and (state.wrote or request.method not in self.SAFE_METHODS)
+
+    def pin(self, request):
+        key = self.pin_key(request)
+        if key:
+            cache.set(key, 1, self.pin_seconds)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = ReplicaState(self.wants_replica(request) and not self.is_pinned(request))
+        token = replica_state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            replica_state.reset(token)
+            if self.needs_pin(request, state):
+                self.pin(request)
+
+    async def __acall__(self, request):
+        # The context variable is set and reset here, on the event loop:
+        # sync_to_async runs each call in a copy of the context, so a token
+        # created in one of them can't be reset in another. Views run in
+        # copies of this context and share the same ReplicaState.
+        use_replica = self.wants_replica(request) and not await sync_to_async(self.is_pinned)(request)
+        state = ReplicaState(use_replica)
+        token = replica_state.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            replica_state.reset(token)
+            if self.needs_pin(request, state):
+                await sync_to_async(self.pin)(request)
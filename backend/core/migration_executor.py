@@ -0,0 +1,139 @@
+import functools
+import multiprocessing
+import sys
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django_tenants.migration_executors import get_executor as get_tenants_executor
+from django_tenants.migration_executors.base import MigrationExecutor, run_migrations
+
+from tenants.template import current_fingerprint
+
+# Schemas whose django_migrations are read per UNION ALL query.
+STATE_CHUNK_SIZE = 200
+
+
+def get_executor(codename=None):
+    # Importing this module is what registers ParallelExecutor with django-tenants.
+    return get_tenants_executor(codename)
+
+
+def _migrate(args, options, codename, tenant):
+    schema_name, tenant_type = tenant
+    started = time.monotonic()
+    try:
+        run_migrations(args, options, codename, schema_name, tenant_type=tenant_type, allow_atomic=False)
+    except Exception as exc:
+        return schema_name, time.monotonic() - started, f"{type(exc).__name__}: {exc}"
+    return schema_name, time.monotonic() - started, None
+
+
+class ParallelExecutor(MigrationExecutor):
+    """
+    Migrates tenant schemas in a pool of TENANT_MIGRATION_PROCESSES worker
+    processes (or --parallel), printing progress and an ETA as schemas finish.
+
+    Schemas whose django_migrations already hold every migration on disk are
+    skipped without starting the migrate command. Finished schemas are
+    checkpointed in the cache under the current migration graph, so a rerun
+    after an interruption picks up with the schemas that were not done.
+    """
+
+    codename = "parallel"
+
+    def run_migrations(self, tenants=None):
+        tenants = list(tenants or [])
+        if self.PUBLIC_SCHEMA_NAME in tenants:
+            tenants.remove(self.PUBLIC_SCHEMA_NAME)
+            run_migrations(self.args, self.options, self.codename, self.PUBLIC_SCHEMA_NAME)
+        self._run([(schema_name, "") for schema_name in tenants])
+
+    def run_multi_type_migrations(self, tenants):
+        self._run([tuple(tenant) for tenant in tenants])
+
+    def _run(self, tenants):
+        if not tenants:
+            return
+        pending = self._pending(tenants)
+        skipped = len(tenants) - len(pending)
+        if skipped:
+            self._write(f"Skipping {skipped} schema(s) that are already up to date.")
+        if not pending:
+            return
+
+        processes = min(len(pending), self._processes())
+        # Workers are forked; they must not share the parent's connection.
+        connections[self.TENANT_DB_ALIAS].close()
+        migrate = functools.partial(_migrate, self.args, self.options, self.codename)
+        context = multiprocessing.get_context("fork")
+        failed = {}
+        started = time.monotonic()
+        with context.Pool(processes=processes, maxtasksperchild=50) as pool:
+            for done, (schema_name, seconds, error) in enumerate(pool.imap_unordered(migrate, pending), 1):
+                if error:
+                    failed[schema_name] = error
+                else:
+                    self._checkpoint(schema_name)
+                elapsed = time.monotonic() - started
+                eta = elapsed / done * (len(pending) - done)
+                self._write(
+                    f"[{done}/{len(pending)}] {schema_name} "
+                    f"{'FAILED' if error else 'migrated'} in {seconds:.1f}s, "
+                    f"{len(failed)} failed, ETA {eta:.0f}s"
+                )
+        if failed:
+            details = "\n".join(f"  {schema_name}: {error}" for schema_name, error in failed.items())
+            raise CommandError(f"Migrating {len(failed)} schema(s) failed:\n{details}")
+
+    def _processes(self):
+        return max(1, int(self.options.get("parallel") or getattr(settings, "TENANT_MIGRATION_PROCESSES", 4)))
+
+    def _write(self, message):
+        if int(self.options.get("verbosity", 1)) >= 1:
+            sys.stdout.write(f"[{self.codename}] {message}\n")
+            sys.stdout.flush()
+
+    @functools.cached_property
+    def _expected(self):
+        return set(MigrationLoader(None, ignore_no_migrations=True).graph.nodes)
+
+    def _checkpoint_key(self, schema_name):
+        return f"tenant:migrate:{current_fingerprint()}:{schema_name}"
+
+    def _checkpoint(self, schema_name):
+        cache.set(
+            self._checkpoint_key(schema_name), 1, getattr(settings, "TENANT_MIGRATION_CHECKPOINT_TTL", 7 * 24 * 3600)
+        )
+
+    def _pending(self, tenants):
+        # Only skip for a plain "migrate everything"; a target migration, a
+        # fake run or similar has to reach every schema.
+        if self.args or self.options.get("app_label") or self.options.get("fake"):
+            return tenants
+        checkpointed = cache.get_many([self._checkpoint_key(schema_name) for schema_name, _ in tenants])
+        tenants = [tenant for tenant in tenants if self._checkpoint_key(tenant[0]) not in checkpointed]
+        applied = self._applied_migrations([schema_name for schema_name, _ in tenants])
+        return [tenant for tenant in tenants if not self._expected <= applied.get(tenant[0], set())]
+
+    def _applied_migrations(self, schema_names):
+        qn = connection.ops.quote_name
+        applied = {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_schema FROM information_schema.tables WHERE table_name = 'django_migrations'"
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            schema_names = [schema_name for schema_name in schema_names if schema_name in existing]
+            for start in range(0, len(schema_names), STATE_CHUNK_SIZE):
+                chunk = schema_names[start:start + STATE_CHUNK_SIZE]
+                sql = " UNION ALL ".join(
+                    f"SELECT %s, app, name FROM {qn(schema_name)}.django_migrations" for schema_name in chunk
+                )
+                cursor.execute(sql, chunk)
+                for schema_name, app, name in cursor.fetchall():
+                    applied.setdefault(schema_name, set()).add((app, name))
+        return applied
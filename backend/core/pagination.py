@@ -0,0 +1,41 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination with opaque cursors, ordered by the view's
+    ``keyset_ordering``. The cursor only records the value of the first
+    ordering field, so that field must be a unique, indexed scalar column
+    such as "id" or "-id": every page is then a single index range scan,
+    however deep. A foreign key or a non-unique first field breaks the
+    next links.
+
+    No COUNT(*) is run unless the client asks for one with ?count=true.
+    """
+
+    ordering = "id"
+    page_size_query_param = "limit"
+    max_page_size = 100
+    count_query_param = "count"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "keyset_ordering", self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, "").lower() in ("1", "true"):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data["count"] = self.count
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count"] = {"type": "integer", "example": 123}
+        return schema
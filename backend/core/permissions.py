@@ -4,6 +4,8 @@ from django.contrib.auth.models import (
     Permission
 )
 
+from authentication.membership import is_tenant_member
+
 class IsTenantMember(BasePermission):
     def has_permission(self, request, view):
         user = request.user
@@ -16,7 +18,9 @@ class IsTenantMember(BasePermission):
         if tenant is None:
             return False
 
-        if tenant not in user.tenant.all():
-            return False
+        # Stateless token users carry their memberships as a claim; tenants
+        # joined after the token was issued are found in the membership cache.
+        if tenant.pk in getattr(user, "tenant_ids", ()):
+            return True
 
-        return True
+        return is_tenant_member(user.pk, tenant.pk)
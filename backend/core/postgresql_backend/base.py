@@ -0,0 +1,158 @@
+import re
+
+import psycopg2.extensions
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import NotSupportedError
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django_tenants.postgresql_backend.base import DatabaseWrapper as TenantDatabaseWrapper
+from django_tenants.utils import get_public_schema_name
+
+from core.postgresql_backend.pool import get_pool
+
+# Statements PostgreSQL refuses to run inside a transaction block, which a
+# "SET LOCAL ...; <statement>" query string implicitly is.
+NO_TRANSACTION_BLOCK = re.compile(
+    r"\s*(VACUUM|(CREATE|DROP)\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY|REINDEX\b[^;]*\bCONCURRENTLY"
+    r"|(CREATE|DROP)\s+DATABASE|ALTER\s+SYSTEM)\b",
+    re.IGNORECASE,
+)
+
+
+class SearchPathCursor(psycopg2.extensions.cursor):
+    """
+    Runs each statement together with a ``SET LOCAL search_path`` for the
+    tenant selected on ``wrapper``, in the same query string. A multi-
+    statement query is one implicit transaction, so the path holds for the
+    statement even in autocommit mode, and nothing outlives the transaction
+    on the server connection PgBouncer lent us.
+
+    Statements that refuse to run in a transaction block (VACUUM, CREATE
+    INDEX CONCURRENTLY, ...) are sent alone, which is only allowed while the
+    public schema is selected.
+    """
+
+    wrapper = None
+
+    def execute(self, query, vars=None):
+        return super().execute(self.wrapper.search_path_prefix(query) + query, vars)
+
+    def executemany(self, query, vars_list):
+        return super().executemany(self.wrapper.search_path_prefix(query) + query, vars_list)
+
+
+class DatabaseWrapper(TenantDatabaseWrapper):
+    """
+    Remembers the search_path that is active on the connection so that
+    selecting the schema already in use does not issue another
+    ``SET search_path``. With persistent connections consecutive requests
+    often hit the same tenant, and each of them used to reset it.
+
+    ``search_path_sets`` and ``search_path_sets_skipped`` count the SET
+    statements issued and avoided on this connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.search_path_sets = 0
+        self.search_path_sets_skipped = 0
+        super().__init__(*args, **kwargs)
+        # Behind a transaction-mode pooler (PgBouncer) no session state can be
+        # relied on, so the search_path is set per transaction with SET LOCAL
+        # instead of once per connection. See SearchPathCursor.
+        self.transaction_pooling = self.settings_dict.get("TRANSACTION_POOLING", False)
+        self._transaction_search_path = None
+        # Named cursors are declared outside SearchPathCursor, and a WITH HOLD
+        # one outlives its transaction, so neither could get the tenant's path.
+        if self.transaction_pooling and not self.settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+            raise ImproperlyConfigured(
+                f"Database '{self.alias}' sets TRANSACTION_POOLING without DISABLE_SERVER_SIDE_CURSORS."
+            )
+
+    @property
+    def connection_pool(self):
+        # The POOL setting enables the in-process pool (see pool.py); closing
+        # the connection then returns it to the pool.
+        options = self.settings_dict.get("POOL")
+        return get_pool(self.alias, options) if options else None
+
+    def get_new_connection(self, conn_params):
+        pool = self.connection_pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Normally set by the parent when it connects, which a reused
+        # connection skips.
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = (
+            IsolationLevel.READ_COMMITTED if isolation_level is None else IsolationLevel(isolation_level)
+        )
+        return connection
+
+    def _close(self):
+        pool = self.connection_pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+
+    def create_cursor(self, name=None):
+        if not self.transaction_pooling or name:
+            return super().create_cursor(name)
+        cursor = self.connection.cursor(cursor_factory=SearchPathCursor)
+        cursor.wrapper = self
+        cursor.tzinfo_factory = self.tzinfo_factory if settings.USE_TZ else None
+        return cursor
+
+    def search_path_prefix(self, query=""):
+        search_paths = self._get_cursor_search_paths()
+        if self.get_autocommit() and isinstance(query, str) and NO_TRANSACTION_BLOCK.match(query):
+            # Must run on its own, so only where the server's default path
+            # (public) is the right one.
+            if self.schema_name != get_public_schema_name():
+                raise NotSupportedError(
+                    "Statements that can't run in a transaction block can't get a tenant search_path "
+                    "behind a transaction pooler; run them on a direct connection or schema-qualify them "
+                    "from the public schema."
+                )
+            return ""
+        # Inside a transaction the SET LOCAL from its first statement still
+        # holds; in autocommit mode every statement is its own transaction.
+        if not self.get_autocommit() and search_paths == self._transaction_search_path:
+            self.search_path_sets_skipped += 1
+            return ""
+        self._transaction_search_path = None if self.get_autocommit() else search_paths
+        self.search_path_sets += 1
+        return "SET LOCAL search_path = {0}; ".format(",".join("'{}'".format(s) for s in search_paths))
+
+    def _commit(self):
+        self._transaction_search_path = None
+        return super()._commit()
+
+    def _rollback(self):
+        self._transaction_search_path = None
+        return super()._rollback()
+
+    def _savepoint_rollback(self, sid):
+        # Undoes any SET LOCAL issued since the savepoint.
+        self._transaction_search_path = None
+        return super()._savepoint_rollback(sid)
+
+    def set_tenant(self, tenant, include_public=True):
+        # The parent forgets the search_path on every call; keep what the
+        # server has so _handle_search_path can compare against it. close(),
+        # rollback() and savepoint_rollback() still reset it.
+        active_search_path = self.search_path_set_schemas
+        super().set_tenant(tenant, include_public)
+        self.search_path_set_schemas = active_search_path
+
+    def _handle_search_path(self, cursor=None):
+        if self._setting_search_path or self.transaction_pooling:
+            return
+        if self.search_path_set_schemas and self.search_path_set_schemas == self._get_cursor_search_paths():
+            self.search_path_sets_skipped += 1
+            return
+        # Otherwise TENANT_LIMIT_SET_CALLS would keep the stale path.
+        self.search_path_set_schemas = None
+        super()._handle_search_path(cursor)
+        if self.search_path_set_schemas:
+            self.search_path_sets += 1
@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+from core.utils import metrics
+from core.utils.metrics import Summary
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of psycopg2 connections shared by the threads of one
+    database alias.
+
+    Connections are handed out most recently used first so the idle ones at
+    the other end age out: those idle for longer than ``max_idle`` seconds are
+    closed, down to ``min_size``. A connection idle for at least
+    ``ping_after`` seconds is checked with ``SELECT 1`` before it is handed
+    out, and replaced if the check fails. Waiting longer than ``timeout`` for
+    a free connection raises OperationalError.
+    """
+
+    def __init__(self, min_size=0, max_size=10, max_idle=300, timeout=10, ping_after=0):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._pid = os.getpid()
+        self.wait_time = Summary()
+        self.created = 0
+        self.evicted = 0
+        self.failed_pings = 0
+        self.timeouts = 0
+
+    def getconn(self, connect):
+        started = time.monotonic()
+        while True:
+            conn, idle_for = self._checkout(started)
+            if conn is None:
+                break
+            if idle_for < self.ping_after or self._ping(conn):
+                self.wait_time.observe(time.monotonic() - started)
+                return conn
+            self.failed_pings += 1
+            self._discard(conn)
+        self.wait_time.observe(time.monotonic() - started)
+        try:
+            conn = connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self.created += 1
+        return conn
+
+    def putconn(self, conn):
+        if os.getpid() != self._pid:
+            return
+        if not self._reset(conn):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._evict_idle()
+            self._cond.notify()
+
+    def metrics(self):
+        with self._cond:
+            size, idle = self._size, len(self._idle)
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "created": self.created,
+            "evicted": self.evicted,
+            "failed_pings": self.failed_pings,
+            "timeouts": self.timeouts,
+            "wait_time": self.wait_time.snapshot(),
+        }
+
+    def _checkout(self, started):
+        """
+        Returns an idle connection and how long it was idle, or (None, 0)
+        once the caller may open a new one (a slot has been reserved for it).
+        """
+        with self._cond:
+            self._check_pid()
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    return conn, time.monotonic() - returned_at
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise psycopg2.OperationalError(
+                        f"Timed out after {self.timeout}s waiting for a pooled database connection"
+                    )
+                self._cond.wait(remaining)
+
+    def _check_pid(self):
+        # After a fork the connections belong to the parent; closing them
+        # here would end the parent's sessions, so just forget them.
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._size = 0
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        while len(self._idle) and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self.evicted += 1
+            self._close(conn)
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            # Outside autocommit the ping opened a transaction, and Django
+            # can't change autocommit on a connection inside one.
+            if not conn.autocommit:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    @staticmethod
+    def _reset(conn):
+        """
+        Leaves no transaction or tenant search_path behind for the next
+        borrower, and returns the connection in autocommit mode.
+        """
+        if conn.closed:
+            return False
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("RESET search_path")
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            logger.debug("Error closing a pooled connection", exc_info=True)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                min_size=options.get("MIN_SIZE", 0),
+                max_size=options.get("MAX_SIZE", 10),
+                max_idle=options.get("MAX_IDLE", 300),
+                timeout=options.get("TIMEOUT", 10),
+                ping_after=options.get("PING_AFTER", 0),
+            )
+        return pool
+
+
+def pool_metrics():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.metrics() for alias, pool in pools.items()}
+
+
+metrics.register("db_pools", pool_metrics)
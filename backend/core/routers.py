@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Per-request routing state, set by core.middleware.ReplicaMiddleware. Outside
+# a request (Celery, management commands) everything uses the primary.
+replica_state = ContextVar("replica_state", default=None)
+
+
+class ReplicaState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+def replica_alias():
+    alias = getattr(settings, "REPLICA_DATABASE_ALIAS", "replica")
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaLagMonitor:
+    """
+    Checks the replica's replay lag at most every ``check_interval`` seconds
+    per process. A replica that lags by more than ``max_lag`` seconds, or
+    can't be reached, is not used until a later check finds it healthy.
+    """
+
+    LAG_SQL = (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    )
+
+    def __init__(self, max_lag=5, check_interval=5):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._healthy = False
+        self.lag = None
+
+    def is_healthy(self, alias):
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._healthy
+            # Other threads keep the last result while this one checks.
+            self._checked_at = time.monotonic()
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(self.LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except Exception:
+            logger.warning("Could not check the lag of replica %s", alias, exc_info=True)
+            self.lag, self._healthy = None, False
+            return False
+        self.lag = float(lag or 0)
+        self._healthy = self.lag <= self.max_lag
+        if not self._healthy:
+            logger.warning("Replica %s is %.1fs behind; reading from the primary", alias, self.lag)
+        return self._healthy
+
+
+lag_monitor = ReplicaLagMonitor(
+    max_lag=getattr(settings, "REPLICA_MAX_LAG", 5),
+    check_interval=getattr(settings, "REPLICA_LAG_CHECK_INTERVAL", 5),
+)
+
+
+def _sync_tenant(alias):
+    # django-tenants only switches the default connection; give the replica
+    # the same tenant, and with it the same search_path.
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if (replica.schema_name, replica.include_public_schema) != (primary.schema_name, primary.include_public_schema):
+        replica.set_tenant(primary.tenant, primary.include_public_schema)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica for requests ReplicaMiddleware marked as safe,
+    while the replica is within REPLICA_MAX_LAG. Reads inside a transaction
+    on the primary, and everything after the request's first write, stay on
+    the primary. Placed before TenantSyncRouter, which still decides migrations.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = replica_state.get()
+        alias = replica_alias()
+        if state is None or not state.use_replica or alias is None:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or not lag_monitor.is_healthy(alias):
+            return None
+        _sync_tenant(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = replica_state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        # Without this, saving an object read from the replica would follow
+        # its _state.db there.
+        return DEFAULT_DB_ALIAS if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
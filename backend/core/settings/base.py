@@ -11,20 +11,57 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 AUTH_USER_MODEL = "authentication.User"
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 
-DATABASE_ROUTERS = ("django_tenants.routers.TenantSyncRouter",)
+DATABASE_ROUTERS = (
+    "core.routers.ReplicaRouter",
+    "django_tenants.routers.TenantSyncRouter",
+)
 
 # Database configuration
 DATABASES = {
     'default': {
-        "ENGINE": "django_tenants.postgresql_backend",
+        "ENGINE": "core.postgresql_backend",
         'NAME': os.environ.get('POSTGRES_DB'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('POSTGRES_HOST'),
         'PORT': os.environ.get('POSTGRES_PORT'),
+        # Set when connecting through PgBouncer in transaction pooling mode:
+        # the tenant search_path is then set per transaction with SET LOCAL,
+        # and server-side cursors, which outlive transactions, are disabled.
+        'TRANSACTION_POOLING': os.environ.get('DB_TRANSACTION_POOLING', 'False') == 'True',
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_TRANSACTION_POOLING', 'False') == 'True',
+        # In-process connection pool, used when DB_POOL_MAX_SIZE > 0. Idle
+        # connections beyond MIN_SIZE close after MAX_IDLE seconds; those idle
+        # for PING_AFTER seconds or more are pinged before reuse.
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 0)),
+            'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'PING_AFTER': int(os.environ.get('DB_POOL_PING_AFTER', 0)),
+        } if int(os.environ.get('DB_POOL_MAX_SIZE', 0)) > 0 else None,
     }
 }
 
+# Streaming replica used by ReplicaRouter for safe reads on REPLICA_READ_PATHS.
+# Clients that just wrote read from the primary for REPLICA_PIN_SECONDS, and
+# the replica is skipped while it lags by more than REPLICA_MAX_LAG seconds.
+if os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('POSTGRES_REPLICA_HOST'),
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', os.environ.get('POSTGRES_PORT')),
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_READ_PATHS = [
+    r'^/api/permissions/',
+    r'^/api/tenants/$',
+    r'^/api/tenants/invite/pending$',
+]
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = int(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+
 # Redis Configuration
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PORT = os.environ.get('REDIS_PORT')
@@ -52,6 +89,80 @@ CACHES = {
     }
 }
 
+# Tenant resolution cache: in-process LRU in front of the Redis cache above.
+TENANT_CACHE_LOCAL_MAXSIZE = int(os.environ.get('TENANT_CACHE_LOCAL_MAXSIZE', 1024))
+TENANT_CACHE_LOCAL_TTL = int(os.environ.get('TENANT_CACHE_LOCAL_TTL', 30))
+TENANT_CACHE_TTL = int(os.environ.get('TENANT_CACHE_TTL', 300))
+TENANT_CACHE_NEGATIVE_TTL = int(os.environ.get('TENANT_CACHE_NEGATIVE_TTL', 60))
+# Seconds before other processes drop a tenant invalidated by a save or delete.
+TENANT_CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get('TENANT_CACHE_VERSION_CHECK_INTERVAL', 1))
+# Seconds between checks for Domain changes made by other processes.
+TENANT_DOMAIN_INDEX_CHECK_INTERVAL = int(os.environ.get('TENANT_DOMAIN_INDEX_CHECK_INTERVAL', 5))
+
+# New tenants are cloned from this fully migrated and seeded schema, which is
+# rebuilt by build_tenant_template (or a Celery task) when migrations change.
+TENANT_BASE_SCHEMA = os.environ.get('TENANT_BASE_SCHEMA', 'tenant_template')
+TENANT_CREATION_FAKES_MIGRATIONS = os.environ.get('TENANT_CREATION_FAKES_MIGRATIONS', 'True') == 'True'
+TENANT_TEMPLATE_BUILD_TIMEOUT = int(os.environ.get('TENANT_TEMPLATE_BUILD_TIMEOUT', 30 * 60))
+# Warm pool of ready schemas claimed by new tenants, topped back up to
+# TENANT_SCHEMA_POOL_SIZE once it falls to the low-water mark. 0 disables it.
+TENANT_SCHEMA_POOL_SIZE = int(os.environ.get('TENANT_SCHEMA_POOL_SIZE', 10))
+TENANT_SCHEMA_POOL_LOW_WATER = int(os.environ.get('TENANT_SCHEMA_POOL_LOW_WATER', 3))
+# Rows per INSERT when seeding fixtures into new tenant schemas.
+TENANT_SEED_BATCH_SIZE = int(os.environ.get('TENANT_SEED_BATCH_SIZE', 1000))
+# Rows fetched per round trip by tenant exports.
+TENANT_EXPORT_CHUNK_SIZE = int(os.environ.get('TENANT_EXPORT_CHUNK_SIZE', 2000))
+# Cross-tenant analytics (tenants.analytics.fan_out): schemas per UNION ALL
+# query, and how many of those run at once. 0 means one per CPU.
+TENANT_ANALYTICS_CHUNK_SIZE = int(os.environ.get('TENANT_ANALYTICS_CHUNK_SIZE', 100))
+TENANT_ANALYTICS_WORKERS = int(os.environ.get('TENANT_ANALYTICS_WORKERS', 0))
+# The provision_tenant task, which creates, migrates and seeds new tenant schemas.
+TENANT_PROVISIONING_MAX_RETRIES = int(os.environ.get('TENANT_PROVISIONING_MAX_RETRIES', 5))
+TENANT_PROVISIONING_TIME_LIMIT = int(os.environ.get('TENANT_PROVISIONING_TIME_LIMIT', 15 * 60))
+# Tenant teardown (teardown_tenant): rows deleted per transaction, the pause
+# between batches and how long a batch or DROP waits for locks before backing off.
+TENANT_TEARDOWN_BATCH_SIZE = int(os.environ.get('TENANT_TEARDOWN_BATCH_SIZE', 500))
+TENANT_TEARDOWN_BATCH_PAUSE = float(os.environ.get('TENANT_TEARDOWN_BATCH_PAUSE', 0.05))
+TENANT_TEARDOWN_LOCK_TIMEOUT = int(os.environ.get('TENANT_TEARDOWN_LOCK_TIMEOUT', 2000))
+TENANT_TEARDOWN_LOCK_RETRIES = int(os.environ.get('TENANT_TEARDOWN_LOCK_RETRIES', 5))
+TENANT_TEARDOWN_MAX_RETRIES = int(os.environ.get('TENANT_TEARDOWN_MAX_RETRIES', 5))
+TENANT_TEARDOWN_TIME_LIMIT = int(os.environ.get('TENANT_TEARDOWN_TIME_LIMIT', 60 * 60))
+
+# migrate_schemas --executor=parallel: tenant schemas migrated at once, and
+# how long finished schemas stay checkpointed for a resumed run.
+GET_EXECUTOR_FUNCTION = 'core.migration_executor.get_executor'
+TENANT_MIGRATION_PROCESSES = int(os.environ.get('TENANT_MIGRATION_PROCESSES', 4))
+TENANT_MIGRATION_CHECKPOINT_TTL = int(os.environ.get('TENANT_MIGRATION_CHECKPOINT_TTL', 7 * 24 * 3600))
+
+# Per-tenant usage metering: threads hand their counters to the Redis flusher
+# every USAGE_FLUSH_INTERVAL seconds; rollup_tenant_usage moves them to Postgres.
+USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', 10))
+USAGE_REDIS_TTL = int(os.environ.get('USAGE_REDIS_TTL', 2 * 24 * 3600))
+
+# Per-tenant limits enforced by TenantMainMiddleware, overridable per tenant
+# with Tenant.settings["limits"] = {"rate": ..., "burst": ..., "concurrency": ...}.
+# Requests per second (0 disables), bucket size, and concurrent requests (0 disables).
+TENANT_RATE_LIMIT = float(os.environ.get('TENANT_RATE_LIMIT', 50))
+TENANT_RATE_LIMIT_BURST = int(os.environ.get('TENANT_RATE_LIMIT_BURST', 100))
+TENANT_CONCURRENCY_LIMIT = int(os.environ.get('TENANT_CONCURRENCY_LIMIT', 0))
+# Tokens a worker takes from Redis at a time, and seconds after which a
+# concurrency slot left behind by a dead worker is reclaimed.
+TENANT_RATE_LIMIT_LEASE = int(os.environ.get('TENANT_RATE_LIMIT_LEASE', 5))
+TENANT_CONCURRENCY_SLOT_TTL = int(os.environ.get('TENANT_CONCURRENCY_SLOT_TTL', 60))
+
+# Per-user tenant membership sets used by IsTenantMember.
+MEMBERSHIP_CACHE_LOCAL_MAXSIZE = int(os.environ.get('MEMBERSHIP_CACHE_LOCAL_MAXSIZE', 4096))
+MEMBERSHIP_CACHE_LOCAL_TTL = int(os.environ.get('MEMBERSHIP_CACHE_LOCAL_TTL', 30))
+MEMBERSHIP_CACHE_TTL = int(os.environ.get('MEMBERSHIP_CACHE_TTL', 300))
+
+# Per (tenant, user) role/permission snapshots used by HasRole/HasPermission.
+RBAC_CACHE_LOCAL_MAXSIZE = int(os.environ.get('RBAC_CACHE_LOCAL_MAXSIZE', 4096))
+RBAC_CACHE_LOCAL_TTL = int(os.environ.get('RBAC_CACHE_LOCAL_TTL', 30))
+RBAC_CACHE_TTL = int(os.environ.get('RBAC_CACHE_TTL', 600))
+RBAC_VERSION_LOCAL_TTL = int(os.environ.get('RBAC_VERSION_LOCAL_TTL', 5))
+# Tenant schemas per UNION ALL query when evaluating permissions in bulk.
+RBAC_BULK_CHUNK_SIZE = int(os.environ.get('RBAC_BULK_CHUNK_SIZE', 200))
+
 
 SHARED_APPS = (
     "django_tenants",
@@ -79,6 +190,8 @@ INSTALLED_APPS = list(SHARED_APPS) + [
 
 MIDDLEWARE = [
     "core.middleware.TenantMainMiddleware",
+    "core.middleware.UsageMiddleware",
+    "core.middleware.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -108,12 +221,12 @@ TEMPLATES = [
 
 
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",  # noqa
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "PAGE_SIZE": 10,
     "NON_FIELD_ERRORS_KEY": "error",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "authentication.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -131,8 +244,21 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
     "UPDATE_LAST_LOGIN": False,
+    "TOKEN_USER_CLASS": "authentication.authentication.TenantTokenUser",
+    "TOKEN_REFRESH_SERIALIZER": "authentication.serializers.TenantTokenRefreshSerializer",
 }
 
+# OutstandingToken rows for issued refresh tokens are written in batches.
+OUTSTANDING_TOKEN_BATCH_SIZE = int(os.environ.get('OUTSTANDING_TOKEN_BATCH_SIZE', 100))
+OUTSTANDING_TOKEN_FLUSH_INTERVAL = float(os.environ.get('OUTSTANDING_TOKEN_FLUSH_INTERVAL', 2))
+
+# Blacklisted jtis live in Redis, or in the token_blacklist tables while Redis
+# is down. Each process keeps a Bloom filter over those rows, rebuilt every
+# REBUILD_INTERVAL seconds; prune_expired_tokens clears them over time.
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = float(os.environ.get('TOKEN_BLACKLIST_BLOOM_ERROR_RATE', 0.01))
+TOKEN_BLACKLIST_BLOOM_REBUILD_INTERVAL = int(os.environ.get('TOKEN_BLACKLIST_BLOOM_REBUILD_INTERVAL', 300))
+TOKEN_PRUNE_CHUNK_SIZE = int(os.environ.get('TOKEN_PRUNE_CHUNK_SIZE', 1000))
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Your Project API",
     "DESCRIPTION": "Your project description",
@@ -143,6 +269,14 @@ SPECTACULAR_SETTINGS = {
 WSGI_APPLICATION = 'core.wsgi.application'
 
 
+AUTHENTICATION_BACKENDS = ["authentication.backends.PooledPasswordBackend"]
+
+# Password hashing runs in a per-worker process pool; requests beyond
+# workers + queue depth get a 503 with Retry-After. 0 workers hashes inline.
+PASSWORD_HASH_POOL_WORKERS = int(os.environ.get('PASSWORD_HASH_POOL_WORKERS', 2))
+PASSWORD_HASH_POOL_QUEUE_DEPTH = int(os.environ.get('PASSWORD_HASH_POOL_QUEUE_DEPTH', 8))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -199,5 +333,17 @@ app.conf.beat_schedule = {
     "fetch-all-rss": {
         "task": "encyclopedia.tasks.fetch_all_rss_feeds",
         "schedule": crontab(minute="*/30"),
-    }
+    },
+    "prune-expired-tokens": {
+        "task": "authentication.tasks.prune_expired_tokens",
+        "schedule": crontab(minute=0, hour="*/6"),
+    },
+    "rollup-tenant-usage": {
+        "task": "tenants.tasks.rollup_tenant_usage",
+        "schedule": crontab(minute="*/5"),
+    },
+    "refill-tenant-schema-pool": {
+        "task": "tenants.tasks.refill_schema_pool",
+        "schedule": crontab(minute="*/5"),
+    },
 }
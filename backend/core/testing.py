@@ -0,0 +1,21 @@
+from django.test import override_settings
+from django_tenants.test.cases import TenantTestCase
+
+# Tests don't need Redis; the cache-backed paths fall back or use locmem.
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE,
+    # Create the test schema by migrating it rather than from the template.
+    TENANT_BASE_SCHEMA=None,
+    TENANT_RATE_LIMIT=0,
+    TENANT_CONCURRENCY_LIMIT=0,
+)
+class TenantAPITestCase(TenantTestCase):
+    """TenantTestCase for this project's Tenant model; requires PostgreSQL."""
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name = "Test tenant"
+        tenant.admin_email = "admin@example.com"
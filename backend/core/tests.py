@@ -0,0 +1,276 @@
+from unittest import mock
+
+import psycopg2.extensions
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import NotSupportedError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.middleware import ReplicaMiddleware
+from core.migration_executor import ParallelExecutor
+from core.postgresql_backend.base import DatabaseWrapper
+from core.postgresql_backend.pool import ConnectionPool
+from core.routers import replica_state
+from core.testing import LOCMEM_CACHE, TenantAPITestCase
+from core.urls_public import Metrics
+from core.utils import metrics
+from core.utils.cache import MISSING, TwoTierCache
+
+
+@override_settings(CACHES=LOCMEM_CACHE, REPLICA_READ_PATHS=[r"^/api/permissions/"], REPLICA_PIN_SECONDS=10)
+class ReplicaMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.seen = []
+
+    def view(self, request):
+        state = replica_state.get()
+        self.seen.append(state.use_replica)
+        if request.method == "POST":
+            state.wrote = True
+        return HttpResponse()
+
+    async def async_view(self, request):
+        # Views of an async stack run their sync code through sync_to_async.
+        return await sync_to_async(self.view)(request)
+
+    def test_async_request_without_replica(self):
+        middleware = ReplicaMiddleware(self.async_view)
+        response = async_to_sync(middleware)(self.factory.get("/api/permissions/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.seen, [False])
+        self.assertIsNone(replica_state.get())
+
+    def test_async_write_pins_client_to_primary(self):
+        middleware = ReplicaMiddleware(self.async_view)
+        headers = {"HTTP_AUTHORIZATION": "Bearer abc"}
+        with mock.patch("core.middleware.replica_alias", return_value="replica"):
+            async_to_sync(middleware)(self.factory.get("/api/permissions/", **headers))
+            async_to_sync(middleware)(self.factory.post("/api/permissions/", **headers))
+            async_to_sync(middleware)(self.factory.get("/api/permissions/", **headers))
+        self.assertEqual(self.seen, [True, False, False])
+        self.assertIsNone(replica_state.get())
+
+    def test_sync_request_outside_read_paths_uses_primary(self):
+        middleware = ReplicaMiddleware(self.view)
+        with mock.patch("core.middleware.replica_alias", return_value="replica"):
+            middleware(self.factory.get("/api/tenants/export/"))
+        self.assertEqual(self.seen, [False])
+        self.assertIsNone(replica_state.get())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TwoTierCacheVersionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_reaches_other_processes_local_tier(self):
+        # Two instances stand in for two worker processes sharing Redis.
+        here = TwoTierCache("test", local_ttl=60, version_check_interval=0)
+        there = TwoTierCache("test", local_ttl=60, version_check_interval=0)
+        here.set("acme", "active")
+        self.assertEqual(there.get("acme"), "active")
+
+        here.set("acme", "inactive")
+        here.invalidate("acme")
+        self.assertIs(there.get("acme"), MISSING)
+
+    def test_without_version_checks_local_copies_survive(self):
+        here = TwoTierCache("test", local_ttl=60)
+        there = TwoTierCache("test", local_ttl=60)
+        here.set("acme", "active")
+        there.get("acme")
+        here.invalidate("acme")
+        self.assertEqual(there.get("acme"), "active")
+
+
+class MetricsViewTests(SimpleTestCase):
+    def get(self, user):
+        request = APIRequestFactory().get("/api/metrics/")
+        force_authenticate(request, user=user)
+        return Metrics.as_view()(request)
+
+    def test_reports_registered_sources_to_staff(self):
+        with mock.patch.dict(metrics._sources, {"example": lambda: {"rejected": 3}}):
+            response = self.get(mock.Mock(is_staff=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["example"], {"rejected": 3})
+
+    def test_forbidden_to_other_users(self):
+        self.assertEqual(self.get(mock.Mock(is_staff=False)).status_code, 403)
+
+
+class FakeConnection:
+    """Tracks the transaction state a psycopg2 connection would be in."""
+
+    closed = False
+
+    def __init__(self):
+        self.autocommit = False
+        self.in_transaction = False
+
+    def cursor(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.execute.side_effect = self.execute
+        return cursor
+
+    def execute(self, sql):
+        if not self.autocommit:
+            self.in_transaction = True
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.in_transaction = False
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_connections_come_back_in_autocommit_without_a_transaction(self):
+        pool = ConnectionPool(max_size=1, ping_after=0)
+        conn = pool.getconn(FakeConnection)
+        conn.execute("BEGIN")
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(FakeConnection), conn)
+        self.assertTrue(conn.autocommit)
+        self.assertFalse(conn.in_transaction)
+
+    def test_ping_outside_autocommit_leaves_no_transaction_open(self):
+        conn = FakeConnection()
+        self.assertTrue(ConnectionPool._ping(conn))
+        self.assertFalse(conn.in_transaction)
+
+    def test_pools_are_reported_as_metrics(self):
+        pool = ConnectionPool(max_size=2)
+        pool.putconn(pool.getconn(FakeConnection))
+        with mock.patch.dict("core.postgresql_backend.pool._pools", {"default": pool}):
+            reported = metrics.collect()["db_pools"]["default"]
+        self.assertEqual((reported["size"], reported["idle"], reported["created"]), (1, 1, 1))
+
+
+def database_wrapper(**settings):
+    # Never connects; only the search_path bookkeeping is exercised.
+    return DatabaseWrapper({**connection.settings_dict, **settings}, alias="search_path_test")
+
+
+class SearchPathTests(SimpleTestCase):
+    def test_set_search_path_only_when_the_schema_changes(self):
+        wrapper = database_wrapper()
+        cursor = mock.Mock()
+        for schema_name in ("acme", "acme", "globex", "globex"):
+            wrapper.set_schema(schema_name)
+            wrapper._handle_search_path(cursor)
+
+        self.assertEqual(
+            [call.args[0] for call in cursor.execute.call_args_list],
+            ["SET search_path = 'acme','public'", "SET search_path = 'globex','public'"],
+        )
+        self.assertEqual((wrapper.search_path_sets, wrapper.search_path_sets_skipped), (2, 2))
+
+    def test_transaction_pooling_sets_the_path_per_transaction(self):
+        wrapper = database_wrapper(TRANSACTION_POOLING=True, DISABLE_SERVER_SIDE_CURSORS=True)
+        wrapper.set_schema("acme")
+        cursor = mock.Mock()
+        wrapper._handle_search_path(cursor)
+        cursor.execute.assert_not_called()
+
+        set_local = "SET LOCAL search_path = 'acme','public'; "
+        with mock.patch.object(wrapper, "get_autocommit", return_value=True):
+            self.assertEqual(wrapper.search_path_prefix(), set_local)
+            self.assertEqual(wrapper.search_path_prefix(), set_local)
+        with mock.patch.object(wrapper, "get_autocommit", return_value=False):
+            self.assertEqual(wrapper.search_path_prefix(), set_local)
+            self.assertEqual(wrapper.search_path_prefix(), "")
+            wrapper.set_schema("globex")
+            self.assertEqual(wrapper.search_path_prefix(), "SET LOCAL search_path = 'globex','public'; ")
+
+    def test_transaction_pooling_requires_disabled_server_side_cursors(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_wrapper(TRANSACTION_POOLING=True)
+
+    @mock.patch.object(DatabaseWrapper, "get_autocommit", return_value=True)
+    def test_statements_that_refuse_transaction_blocks_are_not_prefixed(self, _):
+        wrapper = database_wrapper(TRANSACTION_POOLING=True, DISABLE_SERVER_SIDE_CURSORS=True)
+        wrapper.set_schema_to_public()
+        self.assertEqual(wrapper.search_path_prefix('CREATE INDEX CONCURRENTLY "idx" ON "t" ("c")'), "")
+        self.assertEqual(wrapper.search_path_prefix("vacuum analyze t"), "")
+        wrapper.set_schema("acme")
+        with self.assertRaises(NotSupportedError):
+            wrapper.search_path_prefix('REINDEX TABLE CONCURRENTLY "t"')
+        self.assertTrue(wrapper.search_path_prefix("SELECT 'VACUUM'").startswith("SET LOCAL"))
+
+
+class TransactionPoolingTests(TenantAPITestCase):
+    """Runs SearchPathCursor against PostgreSQL on a connection of its own."""
+
+    def setUp(self):
+        self.wrapper = database_wrapper(TRANSACTION_POOLING=True, DISABLE_SERVER_SIDE_CURSORS=True)
+        self.addCleanup(self.wrapper.close)
+        self.wrapper.set_tenant(self.tenant)
+
+    def search_path(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("SELECT current_setting('search_path')")
+            return cursor.fetchone()[0]
+
+    def session_search_path(self):
+        # A plain psycopg2 cursor, as the next PgBouncer client would see it.
+        with self.wrapper.connection.cursor() as cursor:
+            cursor.execute("SHOW search_path")
+            return cursor.fetchone()[0]
+
+    def test_search_path_holds_per_statement_without_leaking(self):
+        expected = f"{self.tenant.schema_name}, public"
+        self.assertEqual(self.search_path(), expected)
+        self.assertNotIn(self.tenant.schema_name, self.session_search_path())
+
+        self.wrapper.set_autocommit(False)
+        try:
+            self.assertEqual(self.search_path(), expected)
+            self.assertEqual(self.search_path(), expected)
+            self.assertEqual(self.wrapper.search_path_sets_skipped, 1)
+            self.wrapper.commit()
+        finally:
+            self.wrapper.set_autocommit(True)
+        self.assertNotIn(self.tenant.schema_name, self.session_search_path())
+
+    def test_vacuum_runs_in_autocommit_from_the_public_schema(self):
+        self.wrapper.set_schema_to_public()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("VACUUM django_migrations")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+@mock.patch("core.migration_executor.current_fingerprint", return_value="abc")
+class ParallelExecutorTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def executor(self, **options):
+        executor = ParallelExecutor([], {"verbosity": 0, **options})
+        executor._expected = {("app", "0001_initial"), ("app", "0002_more")}
+        return executor
+
+    def test_skips_up_to_date_and_checkpointed_schemas(self, _):
+        executor = self.executor()
+        executor._checkpoint("done")
+        applied = {
+            "current": {("app", "0001_initial"), ("app", "0002_more")},
+            "behind": {("app", "0001_initial")},
+        }
+        tenants = [("done", ""), ("current", ""), ("behind", ""), ("new", "")]
+        with mock.patch.object(executor, "_applied_migrations", return_value=applied) as read_applied:
+            self.assertEqual(executor._pending(tenants), [("behind", ""), ("new", "")])
+        read_applied.assert_called_once_with(["current", "behind", "new"])
+
+    def test_fake_runs_reach_every_schema(self, _):
+        executor = self.executor(fake=True)
+        executor._checkpoint("done")
+        self.assertEqual(executor._pending([("done", "")]), [("done", "")])
@@ -1,3 +1,5 @@
+import os
+
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from django.conf import settings
@@ -8,6 +10,8 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import permissions
 
+from core.utils import metrics
+
 class HealthSerializer(serializers.Serializer):
     message = serializers.CharField()
 
@@ -21,10 +25,20 @@ class Health(APIView):
         return Response(serializer.data)
 
 
+class Metrics(APIView):
+    # In-process metrics (password hashing, connection pool, ...) of the
+    # worker process that serves the request.
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response({"pid": os.getpid(), **metrics.collect()})
+
+
 urlpatterns = [
     path('api/tenants/', include("tenants.urls")),
     path('api/auth/', include("authentication.urls")),
     path('api/health/', Health.as_view(), name='health'),
+    path('api/metrics/', Metrics.as_view(), name='metrics'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
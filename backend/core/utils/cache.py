@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class LocalTTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    In-process LocalTTLCache in front of a shared Django cache (Redis).
+
+    The shared tier is best effort: if it is unreachable, lookups fall through
+    to the caller's loader instead of failing the request.
+
+    With a ``version_check_interval``, invalidate() also bumps a version
+    counter in the shared cache, and every process drops its local entries
+    when it sees the counter change, checking at most that often. Without
+    one, other processes keep their local copies for up to ``local_ttl``.
+    """
+
+    def __init__(self, prefix, maxsize=1024, local_ttl=30, shared_ttl=300, alias='default',
+                 version_check_interval=None):
+        self.prefix = prefix
+        self.local = LocalTTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.shared_ttl = shared_ttl
+        self.alias = alias
+        self.version_check_interval = version_check_interval
+        self._version = None
+        self._version_checked_at = None
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    @property
+    def version_key(self):
+        return f"{self.prefix}:version"
+
+    def _version_due(self):
+        return self.version_check_interval is not None and (
+            self._version_checked_at is None
+            or time.monotonic() - self._version_checked_at >= self.version_check_interval
+        )
+
+    def _seen_version(self, version):
+        self._version_checked_at = time.monotonic()
+        if version != self._version:
+            self.local.clear()
+            self._version = version
+
+    def check_version(self):
+        if not self._version_due():
+            return
+        try:
+            version = self.shared.get(self.version_key)
+        except Exception:
+            logger.warning("Shared cache read failed for %s", self.version_key, exc_info=True)
+            self._version_checked_at = time.monotonic()
+            return
+        self._seen_version(version)
+
+    async def acheck_version(self):
+        if not self._version_due():
+            return
+        try:
+            version = await self.shared.aget(self.version_key)
+        except Exception:
+            logger.warning("Shared cache read failed for %s", self.version_key, exc_info=True)
+            self._version_checked_at = time.monotonic()
+            return
+        self._seen_version(version)
+
+    def invalidate(self, key):
+        """delete() that other processes also notice; see version_check_interval."""
+        self.delete(key)
+        if self.version_check_interval is None:
+            return
+        try:
+            self.shared.add(self.version_key, 0, None)
+            version = self.shared.incr(self.version_key)
+        except Exception:
+            logger.warning("Shared cache write failed for %s", self.version_key, exc_info=True)
+            return
+        # Our own local tier is already current; don't clear it for this bump.
+        if version == (self._version or 0) + 1:
+            self._version = version
+
+    def get(self, key, default=MISSING):
+        self.check_version()
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        try:
+            value = self.shared.get(self.make_key(key), MISSING)
+        except Exception:
+            logger.warning("Shared cache read failed for %s", self.make_key(key), exc_info=True)
+            return default
+        if value is MISSING:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.shared_ttl if ttl is None else ttl
+        self.local.set(key, value, ttl=min(ttl, self.local.ttl))
+        try:
+            self.shared.set(self.make_key(key), value, ttl)
+        except Exception:
+            logger.warning("Shared cache write failed for %s", self.make_key(key), exc_info=True)
+
+    def delete(self, key):
+        self.local.delete(key)
+        try:
+            self.shared.delete(self.make_key(key))
+        except Exception:
+            logger.warning("Shared cache delete failed for %s", self.make_key(key), exc_info=True)
+
+    def get_many(self, keys):
+        self.check_version()
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        if not remaining:
+            return found
+        try:
+            shared = self.shared.get_many([self.make_key(key) for key in remaining])
+        except Exception:
+            logger.warning("Shared cache read failed for %d keys", len(remaining), exc_info=True)
+            return found
+        for key in remaining:
+            value = shared.get(self.make_key(key), MISSING)
+            if value is not MISSING:
+                self.local.set(key, value)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping, ttl=None):
+        ttl = self.shared_ttl if ttl is None else ttl
+        for key, value in mapping.items():
+            self.local.set(key, value, ttl=min(ttl, self.local.ttl))
+        try:
+            self.shared.set_many({self.make_key(key): value for key, value in mapping.items()}, ttl)
+        except Exception:
+            logger.warning("Shared cache write failed for %d keys", len(mapping), exc_info=True)
+
+    async def aget(self, key, default=MISSING):
+        await self.acheck_version()
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        try:
+            value = await self.shared.aget(self.make_key(key), MISSING)
+        except Exception:
+            logger.warning("Shared cache read failed for %s", self.make_key(key), exc_info=True)
+            return default
+        if value is MISSING:
+            return default
+        self.local.set(key, value)
+        return value
+
+    async def aset(self, key, value, ttl=None):
+        ttl = self.shared_ttl if ttl is None else ttl
+        self.local.set(key, value, ttl=min(ttl, self.local.ttl))
+        try:
+            await self.shared.aset(self.make_key(key), value, ttl)
+        except Exception:
+            logger.warning("Shared cache write failed for %s", self.make_key(key), exc_info=True)
+
+    def get_or_load(self, key, loader, ttl=None):
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value, ttl=ttl)
+        return value
@@ -0,0 +1,53 @@
+import threading
+
+
+class Summary:
+    """Thread-safe count/sum/max of observed values, e.g. latencies in seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg": self.total / self.count if self.count else 0.0,
+                "max": self.max,
+            }
+
+
+class Counter:
+    """Thread-safe monotonically increasing count."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+_sources = {}
+
+
+def register(name, source):
+    """
+    Registers ``source``, a callable returning a JSON-serializable dict, to be
+    reported under ``name`` by collect() (served by the /api/metrics/ endpoint).
+    """
+    _sources[name] = source
+
+
+def collect():
+    return {name: source() for name, source in sorted(_sources.items())}
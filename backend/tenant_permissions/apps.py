@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TenantPermissionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tenant_permissions'
+
+    def ready(self):
+        import tenant_permissions.signals  # noqa: F401
@@ -0,0 +1,246 @@
+import logging
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from core.utils.cache import MISSING, LocalTTLCache, TwoTierCache
+from tenant_permissions.models import Role, UserPermissions, UserRoles
+
+logger = logging.getLogger(__name__)
+
+
+class PermissionSnapshot(NamedTuple):
+    """
+    A user's role names and effective permission codenames in one tenant, and
+    the names (Permission.name) of the permissions granted to them directly,
+    which is what HasPermission matches.
+    """
+
+    roles: frozenset
+    permissions: frozenset
+    granted_names: frozenset = frozenset()
+
+
+EMPTY_SNAPSHOT = PermissionSnapshot(frozenset(), frozenset(), frozenset())
+
+snapshot_cache = TwoTierCache(
+    # Bumped whenever PermissionSnapshot changes shape.
+    "rbac:snapshot:v2",
+    maxsize=getattr(settings, "RBAC_CACHE_LOCAL_MAXSIZE", 4096),
+    local_ttl=getattr(settings, "RBAC_CACHE_LOCAL_TTL", 30),
+    shared_ttl=getattr(settings, "RBAC_CACHE_TTL", 600),
+)
+# Snapshot keys embed the tenant's version, so bumping it retires every
+# snapshot of that tenant at once. Versions are re-read every few seconds.
+version_cache = LocalTTLCache(ttl=getattr(settings, "RBAC_VERSION_LOCAL_TTL", 5))
+
+
+def _version_key(schema_name):
+    return f"rbac:version:{schema_name}"
+
+
+def _new_version():
+    # Time based, so a version lost from Redis never comes back lower.
+    return int(time.time() * 1000)
+
+
+def get_version(schema_name):
+    version = version_cache.get(schema_name)
+    if version is not MISSING:
+        return version
+    try:
+        version = cache.get(_version_key(schema_name))
+        if version is None:
+            cache.add(_version_key(schema_name), _new_version(), None)
+            version = cache.get(_version_key(schema_name))
+    except Exception:
+        logger.warning("Could not read the RBAC version of %s", schema_name, exc_info=True)
+        return None
+    version_cache.set(schema_name, version)
+    return version
+
+
+def bump_version(schema_name):
+    version_cache.delete(schema_name)
+    try:
+        try:
+            cache.incr(_version_key(schema_name))
+        except ValueError:
+            cache.set(_version_key(schema_name), _new_version(), None)
+    except Exception:
+        logger.warning("Could not bump the RBAC version of %s", schema_name, exc_info=True)
+
+
+def _load_snapshot(schema_name, user_id):
+    with schema_context(schema_name):
+        roles, permissions = set(), set()
+        for name, codename in Role.objects.filter(user_roles__user_id=user_id).values_list(
+            "name", "permissions__codename"
+        ):
+            roles.add(name)
+            if codename is not None:
+                permissions.add(codename)
+        granted_names = set()
+        for codename, name in UserPermissions.objects.filter(
+            user_id=user_id, permissions__isnull=False
+        ).values_list("permissions__codename", "permissions__name"):
+            permissions.add(codename)
+            granted_names.add(name)
+    return PermissionSnapshot(frozenset(roles), frozenset(permissions), frozenset(granted_names))
+
+
+def get_versions(schema_names):
+    versions = {}
+    remaining = []
+    for schema_name in schema_names:
+        version = version_cache.get(schema_name)
+        if version is MISSING:
+            remaining.append(schema_name)
+        else:
+            versions[schema_name] = version
+    if not remaining:
+        return versions
+    try:
+        found = cache.get_many([_version_key(schema_name) for schema_name in remaining])
+    except Exception:
+        logger.warning("Could not read RBAC versions", exc_info=True)
+        return versions
+    for schema_name in remaining:
+        version = found.get(_version_key(schema_name))
+        if version is None:
+            version = get_version(schema_name)
+        else:
+            version_cache.set(schema_name, version)
+        if version is not None:
+            versions[schema_name] = version
+    return versions
+
+
+def _snapshot_sql(schema_name):
+    """
+    SELECT returning (kind, value) rows for one tenant schema, with every
+    table qualified so the query does not depend on the search_path.
+    """
+    qn = connection.ops.quote_name
+
+    def table(model, schema=schema_name):
+        return f"{qn(schema)}.{qn(model._meta.db_table)}"
+
+    permission = table(Permission, get_public_schema_name())
+    role = table(Role)
+    user_roles = table(UserRoles)
+    user_roles_roles = table(UserRoles.roles.through)
+    role_permissions = table(Role.permissions.through)
+    user_permissions = table(UserPermissions)
+    user_permissions_permissions = table(UserPermissions.permissions.through)
+    return (
+        f"SELECT %s, 'role', r.name FROM {role} r"
+        f" JOIN {user_roles_roles} urr ON urr.role_id = r.id"
+        f" JOIN {user_roles} ur ON ur.id = urr.userroles_id WHERE ur.user_id = %s"
+        f" UNION ALL SELECT %s, 'permission', p.codename FROM {role_permissions} rp"
+        f" JOIN {permission} p ON p.id = rp.permission_id"
+        f" JOIN {user_roles_roles} urr ON urr.role_id = rp.role_id"
+        f" JOIN {user_roles} ur ON ur.id = urr.userroles_id WHERE ur.user_id = %s"
+        f" UNION ALL SELECT %s, 'permission', p.codename FROM {user_permissions_permissions} upp"
+        f" JOIN {permission} p ON p.id = upp.permission_id"
+        f" JOIN {user_permissions} up ON up.id = upp.userpermissions_id WHERE up.user_id = %s"
+        f" UNION ALL SELECT %s, 'granted_name', p.name FROM {user_permissions_permissions} upp"
+        f" JOIN {permission} p ON p.id = upp.permission_id"
+        f" JOIN {user_permissions} up ON up.id = upp.userpermissions_id WHERE up.user_id = %s"
+    )
+
+
+def _existing_schemas(schema_names):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nspname FROM pg_namespace WHERE nspname = ANY(%s)", [list(schema_names)])
+        existing = {row[0] for row in cursor.fetchall()}
+    return [schema_name for schema_name in schema_names if schema_name in existing]
+
+
+def _load_snapshots(schema_names, user_id):
+    """
+    Loads snapshots for many tenants with one UNION ALL query per chunk.
+    Schemas that don't exist (yet, or any more) are left out, as one of them
+    would otherwise fail the query of its whole chunk.
+    """
+    chunk_size = getattr(settings, "RBAC_BULK_CHUNK_SIZE", 200)
+    schema_names = _existing_schemas(schema_names)
+    rows = {
+        schema_name: {"role": set(), "permission": set(), "granted_name": set()} for schema_name in schema_names
+    }
+    user_id = str(user_id)
+    for start in range(0, len(schema_names), chunk_size):
+        chunk = schema_names[start:start + chunk_size]
+        sql = " UNION ALL ".join(_snapshot_sql(schema_name) for schema_name in chunk)
+        params = [value for schema_name in chunk for value in (schema_name, user_id) * 4]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for schema_name, kind, value in cursor.fetchall():
+                rows[schema_name][kind].add(value)
+    return {
+        schema_name: PermissionSnapshot(
+            frozenset(values["role"]), frozenset(values["permission"]), frozenset(values["granted_name"])
+        )
+        for schema_name, values in rows.items()
+    }
+
+
+def get_snapshots(schema_names, user_id):
+    """
+    Snapshots of one user in many tenants. Cached ones are read in one
+    round-trip; the rest are loaded together by _load_snapshots().
+    """
+    schema_names = list(dict.fromkeys(schema_names))
+    versions = get_versions(schema_names)
+    keys = {
+        schema_name: f"{schema_name}:{user_id}:{versions[schema_name]}"
+        for schema_name in schema_names
+        if schema_name in versions
+    }
+    cached = snapshot_cache.get_many(keys.values())
+    snapshots = {
+        schema_name: cached[key] for schema_name, key in keys.items() if key in cached
+    }
+    missing = [schema_name for schema_name in schema_names if schema_name not in snapshots]
+    if missing:
+        loaded = _load_snapshots(missing, user_id)
+        snapshot_cache.set_many({keys[name]: snapshot for name, snapshot in loaded.items() if name in keys})
+        snapshots.update(loaded)
+        # A tenant without a schema grants nothing; not cached, so it is
+        # picked up once the schema is created.
+        for schema_name in missing:
+            snapshots.setdefault(schema_name, EMPTY_SNAPSHOT)
+    return snapshots
+
+
+def evaluate(user_id, schema_names, roles=None, permissions=None):
+    """
+    Which of ``roles`` and ``permissions`` (codenames) the user has in each of
+    ``schema_names``, as {schema_name: PermissionSnapshot}. Passing None for
+    either returns all of the user's roles or permissions.
+    """
+    roles = None if roles is None else frozenset(roles)
+    permissions = None if permissions is None else frozenset(permissions)
+    return {
+        schema_name: PermissionSnapshot(
+            snapshot.roles if roles is None else snapshot.roles & roles,
+            snapshot.permissions if permissions is None else snapshot.permissions & permissions,
+            snapshot.granted_names,
+        )
+        for schema_name, snapshot in get_snapshots(schema_names, user_id).items()
+    }
+
+
+def get_snapshot(schema_name, user_id):
+    version = get_version(schema_name)
+    if version is None:
+        return _load_snapshot(schema_name, user_id)
+    return snapshot_cache.get_or_load(
+        f"{schema_name}:{user_id}:{version}",
+        lambda: _load_snapshot(schema_name, user_id),
+    )
@@ -1,5 +1,6 @@
+from django.db import connection
 from rest_framework.permissions import BasePermission
-from tenant_permissions.models import Role, UserRoles, UserPermissions
+from tenant_permissions.matrix import get_snapshot
 
 
 class HasRole(BasePermission):
@@ -16,11 +17,8 @@ class HasRole(BasePermission):
         if not request.user.is_authenticated:
             return False
 
-
-        return UserRoles.objects.filter(
-            user=request.user,
-            roles__name__in=self.roles
-        ).exists()
+        snapshot = get_snapshot(connection.schema_name, request.user.pk)
+        return not snapshot.roles.isdisjoint(self.roles)
 
 
 class HasPermission(BasePermission):
@@ -37,7 +35,7 @@ class HasPermission(BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        return UserPermissions.objects.filter(
-            user=request.user,
-            permissions__name__in=self.permissions
-        ).exists()
+        # Matches Permission.name of permissions granted to the user directly,
+        # not those that come with a role.
+        snapshot = get_snapshot(connection.schema_name, request.user.pk)
+        return not snapshot.granted_names.isdisjoint(self.permissions)
@@ -0,0 +1,31 @@
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from tenant_permissions.matrix import bump_version
+from tenant_permissions.models import Role, UserPermissions, UserRoles
+
+M2M_ACTIONS = ("post_add", "post_remove", "post_clear")
+
+
+def bump_version_on_commit():
+    # Bumped before the commit, a concurrent get_snapshot() could still read
+    # the old rows and cache them under the new version.
+    schema_name = connection.schema_name
+    transaction.on_commit(lambda: bump_version(schema_name))
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+@receiver(m2m_changed, sender=UserRoles.roles.through)
+@receiver(m2m_changed, sender=UserPermissions.permissions.through)
+def permissions_changed(sender, action, **kwargs):
+    if action in M2M_ACTIONS:
+        bump_version_on_commit()
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_delete, sender=UserRoles)
+@receiver(post_delete, sender=UserPermissions)
+def permissions_saved_or_deleted(sender, **kwargs):
+    bump_version_on_commit()
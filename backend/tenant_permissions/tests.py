@@ -1,3 +1,114 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from authentication.models import User
+from authentication.tokens import TenantRefreshToken
+from core.testing import TenantAPITestCase
+from tenant_permissions.matrix import EMPTY_SNAPSHOT, get_snapshots, get_version
+from tenant_permissions.models import Role, UserPermissions, UserRoles
+from tenant_permissions.permissions import HasPermission
+from tenant_permissions.views import PermissionsListAPIView
+
+
+class PermissionsPaginationTests(TenantAPITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="reader@example.com", first_name="Read", last_name="Er")
+        content_type = ContentType.objects.create(app_label="tests", model="widget")
+        self.created = {
+            Permission.objects.create(content_type=content_type, codename=f"do_{i}", name=f"Do {i}").pk
+            for i in range(5)
+        }
+        self.view = PermissionsListAPIView.as_view(permission_classes=[])
+        self.factory = APIRequestFactory()
+
+    def get(self, url):
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_follows_next_links_past_the_first_page(self):
+        seen = []
+        page = self.get("/api/permissions/?limit=2")
+        while True:
+            seen += [item["id"] for item in page["results"]]
+            if not page["next"]:
+                break
+            page = self.get(page["next"])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen, sorted(seen))
+        self.assertLessEqual(self.created, set(seen))
+
+
+class SnapshotVersionTests(TenantAPITestCase):
+    def test_version_is_bumped_once_the_change_commits(self):
+        schema_name = self.tenant.schema_name
+        before = get_version(schema_name)
+        with self.captureOnCommitCallbacks(execute=True):
+            Role.objects.create(name="EDITOR")
+            self.assertEqual(get_version(schema_name), before)
+        self.assertNotEqual(get_version(schema_name), before)
+
+
+class BulkSnapshotTests(TenantAPITestCase):
+    def test_missing_schema_does_not_fail_the_others_in_its_chunk(self):
+        user = User.objects.create(email="editor@example.com", first_name="Ed", last_name="Itor")
+        user_roles = UserRoles.objects.create(user=user)
+        user_roles.roles.add(Role.objects.create(name="EDITOR"))
+
+        snapshots = get_snapshots([self.tenant.schema_name, "dropped_tenant"], user.pk)
+
+        self.assertEqual(snapshots[self.tenant.schema_name].roles, {"EDITOR"})
+        self.assertEqual(snapshots["dropped_tenant"], EMPTY_SNAPSHOT)
+
+
+class StatelessRequestTests(TenantAPITestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            email="member@example.com", first_name="Mem", last_name="Ber", is_verified=True
+        )
+        self.user.tenant.add(self.tenant)
+        with mock.patch("authentication.tokens.outstanding_token_writer"):
+            access = TenantRefreshToken.for_user(self.user).access_token
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {access}", "HTTP_X_TENANT_ID": self.tenant.schema_name}
+
+    def test_authenticated_tenant_request_makes_no_queries(self):
+        # The first request fills the tenant, domain and RBAC caches. After
+        # that, authentication, tenant resolution and the role check (which
+        # refuses a plain member) are served without touching the database.
+        self.assertEqual(self.client.get("/api/permissions/roles/", **self.headers).status_code, 403)
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/permissions/roles/", **self.headers)
+        self.assertEqual(response.status_code, 403)
+
+
+class HasPermissionTests(TenantAPITestCase):
+    def setUp(self):
+        content_type = ContentType.objects.create(app_label="tests", model="gadget")
+        self.permission = Permission.objects.create(
+            content_type=content_type, codename="change_gadget", name="Can change gadget"
+        )
+
+    def allowed(self, user, permission="Can change gadget"):
+        return HasPermission([permission]).has_permission(mock.Mock(user=user), view=None)
+
+    def user(self, email):
+        return User.objects.create(email=email, first_name="Us", last_name="Er")
+
+    def test_matches_names_of_direct_grants(self):
+        user = self.user("granted@example.com")
+        UserPermissions.objects.create(user=user).permissions.add(self.permission)
+        self.assertTrue(self.allowed(user))
+        self.assertFalse(self.allowed(user, "change_gadget"))
+
+    def test_permissions_of_roles_do_not_count(self):
+        user = self.user("editor@example.com")
+        role = Role.objects.create(name="GADGET_EDITOR")
+        role.permissions.add(self.permission)
+        UserRoles.objects.create(user=user).roles.add(role)
+        self.assertFalse(self.allowed(user))
+        self.assertTrue(user.has_tenant_permission(self.tenant.schema_name, "change_gadget"))
@@ -17,16 +17,17 @@ from rest_framework import generics
 from django.db.models import Q
 
 from tenant_permissions.permissions import HasRole
+from authentication.authentication import get_user_instance
 
 
 class PermissionsListAPIView(generics.ListAPIView):
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
+    keyset_ordering = 'id'
 
     def get_queryset(self):
         exclude_range = list(range(1, 11)) + list(range(22, 28))
-        queryset = self.queryset.exclude(content_type_id__in=exclude_range).order_by('content_type')
-        return queryset
+        return self.queryset.exclude(content_type_id__in=exclude_range)
 
 
 class RoleListCreateAPIView(generics.ListCreateAPIView):
@@ -58,5 +59,5 @@ class Me(generics.GenericAPIView):
 
 
     def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(request.user)
+        serializer = self.get_serializer(get_user_instance(request.user))
         return Response(serializer.data)
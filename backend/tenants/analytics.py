@@ -0,0 +1,130 @@
+import itertools
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django_tenants.utils import get_public_schema_name
+
+from core.routers import lag_monitor, replica_alias
+from tenants.models import StatusChoices, Tenant
+
+ROLE_COUNTS_SQL = """
+    SELECT r.name AS role, count(ur.id) AS users
+    FROM {schema}.tenant_permissions_role r
+    LEFT JOIN {schema}.tenant_permissions_userroles_roles ur ON ur.role_id = r.id
+    GROUP BY r.name
+"""
+
+# Invitations live in the public schema, so this needs no fan-out.
+PENDING_INVITATIONS_SQL = """
+    SELECT t.schema_name,
+           CASE WHEN i.created_at > now() - interval '1 day' THEN '<1d'
+                WHEN i.created_at > now() - interval '7 days' THEN '1-7d'
+                WHEN i.created_at > now() - interval '30 days' THEN '7-30d'
+                ELSE '>30d' END AS age,
+           count(*) AS invitations
+    FROM tenants_invitation i JOIN tenants_tenant t ON t.id = i.tenant_id
+    WHERE NOT i.is_accepted
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+
+def _alias():
+    # Read-only, so the replica is used whenever it is healthy.
+    alias = replica_alias()
+    if alias is not None and lag_monitor.is_healthy(alias):
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def _dicts(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def tenant_schemas():
+    """Schemas of tenants not being torn down that exist in the database."""
+    schema_names = list(
+        Tenant.objects.exclude(schema_name=get_public_schema_name())
+        .exclude(tenant_status=StatusChoices.INACTIVE)
+        .order_by("schema_name")
+        .values_list("schema_name", flat=True)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nspname FROM pg_namespace WHERE nspname = ANY(%s)", [schema_names])
+        existing = {row[0] for row in cursor.fetchall()}
+    return [schema_name for schema_name in schema_names if schema_name in existing]
+
+
+def _run_chunk(alias, sql, params, schema_names):
+    qn = connections[alias].ops.quote_name
+    union = " UNION ALL ".join(
+        f"SELECT %s AS schema_name, q.* FROM ({sql.format(schema=qn(schema_name))}) AS q"
+        for schema_name in schema_names
+    )
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(union, [value for schema_name in schema_names for value in (schema_name, *params)])
+            return _dicts(cursor)
+    finally:
+        # Worker threads each have their own connection; don't leave it open.
+        connections[alias].close()
+
+
+def fan_out(sql, params=(), schema_names=None, chunk_size=None, workers=None):
+    """
+    Runs ``sql`` against every tenant schema and yields its rows as dicts with
+    a leading "schema_name". ``{schema}`` in ``sql`` is replaced by each quoted
+    schema name and ``params`` are bound once per schema.
+
+    Schemas are combined TENANT_ANALYTICS_CHUNK_SIZE at a time into one
+    UNION ALL query, and up to TENANT_ANALYTICS_WORKERS of those run at once
+    on their own connections. Rows are yielded as each chunk finishes, in no
+    particular order, with at most two chunks per worker in flight.
+    """
+    chunk_size = chunk_size or getattr(settings, "TENANT_ANALYTICS_CHUNK_SIZE", 100)
+    workers = workers or getattr(settings, "TENANT_ANALYTICS_WORKERS", None) or os.cpu_count() or 4
+    if schema_names is None:
+        schema_names = tenant_schemas()
+    alias = _alias()
+    chunks = (schema_names[start:start + chunk_size] for start in range(0, len(schema_names), chunk_size))
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tenant-analytics")
+    try:
+        pending = {
+            executor.submit(_run_chunk, alias, sql, params, chunk) for chunk in itertools.islice(chunks, 2 * workers)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.add(executor.submit(_run_chunk, alias, sql, params, chunk))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def role_counts():
+    return fan_out(ROLE_COUNTS_SQL)
+
+
+def pending_invitations():
+    with connections[_alias()].cursor() as cursor:
+        cursor.execute(PENDING_INVITATIONS_SQL)
+        yield from _dicts(cursor)
+
+
+QUERIES = {
+    "role_counts": role_counts,
+    "pending_invitations": pending_invitations,
+}
+
+
+def ndjson(rows):
+    for row in rows:
+        yield (json.dumps(row, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n").encode()
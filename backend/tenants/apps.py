@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RiggTenantsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "tenants"
+
+    def ready(self):
+        import tenants.signals  # noqa: F401
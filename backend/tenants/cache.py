@@ -0,0 +1,70 @@
+import copy
+
+from django.conf import settings
+
+from core.utils.cache import MISSING, TwoTierCache
+from tenants.models import Tenant
+
+# Stored instead of a Tenant for schema names that do not exist, so unknown
+# X-Tenant-ID values don't reach the database on every request.
+TENANT_NOT_FOUND = "__tenant_not_found__"
+
+tenant_cache = TwoTierCache(
+    "tenant:schema",
+    maxsize=getattr(settings, "TENANT_CACHE_LOCAL_MAXSIZE", 1024),
+    local_ttl=getattr(settings, "TENANT_CACHE_LOCAL_TTL", 30),
+    shared_ttl=getattr(settings, "TENANT_CACHE_TTL", 300),
+    version_check_interval=getattr(settings, "TENANT_CACHE_VERSION_CHECK_INTERVAL", 1),
+)
+
+
+def _cache_entry(tenant):
+    if tenant is None:
+        return TENANT_NOT_FOUND, getattr(settings, "TENANT_CACHE_NEGATIVE_TTL", 60)
+    return tenant, None
+
+
+def _from_cache_entry(tenant):
+    if tenant == TENANT_NOT_FOUND:
+        return None
+    # Callers set per-request attributes such as domain_url on the tenant.
+    return copy.copy(tenant)
+
+
+def _load_tenant(schema_name):
+    # Exact match first so the unique index on schema_name is used; schema
+    # names are compared ignoring case, so fall back to iexact on a miss.
+    tenant = Tenant.objects.filter(schema_name=schema_name).first()
+    if tenant is None:
+        tenant = Tenant.objects.filter(schema_name__iexact=schema_name).first()
+    return tenant
+
+
+async def _aload_tenant(schema_name):
+    tenant = await Tenant.objects.filter(schema_name=schema_name).afirst()
+    if tenant is None:
+        tenant = await Tenant.objects.filter(schema_name__iexact=schema_name).afirst()
+    return tenant
+
+
+def get_tenant_by_schema(schema_name):
+    key = schema_name.lower()
+    tenant = tenant_cache.get(key)
+    if tenant is MISSING:
+        tenant, ttl = _cache_entry(_load_tenant(key))
+        tenant_cache.set(key, tenant, ttl=ttl)
+    return _from_cache_entry(tenant)
+
+
+async def aget_tenant_by_schema(schema_name):
+    key = schema_name.lower()
+    tenant = await tenant_cache.aget(key)
+    if tenant is MISSING:
+        tenant, ttl = _cache_entry(await _aload_tenant(key))
+        await tenant_cache.aset(key, tenant, ttl=ttl)
+    return _from_cache_entry(tenant)
+
+
+def invalidate_tenant(schema_name):
+    # Every process drops its local copy within TENANT_CACHE_VERSION_CHECK_INTERVAL.
+    tenant_cache.invalidate(schema_name.lower())
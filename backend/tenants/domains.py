@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from tenants.models import Domain
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "tenant:domain_index:version"
+WILDCARD_PREFIX = "*."
+
+
+class DomainIndex:
+    """
+    In-memory hostname -> schema_name map built from every Domain row.
+
+    Domains are matched exactly, then against wildcard rows such as
+    ``*.example.com`` from the most to the least specific suffix. Changes made
+    in this process are applied in place by the Domain signals; other
+    processes notice them through a version counter in the shared cache and
+    reload at most every TENANT_DOMAIN_INDEX_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._wildcard = {}
+        self._by_pk = {}
+        self._version = None
+        self._loaded = False
+        self._checked_at = 0.0
+
+    @staticmethod
+    def normalize(domain):
+        return domain.strip().lower().rstrip(".")
+
+    def is_due(self):
+        return not self._loaded or time.monotonic() - self._checked_at >= self.check_interval
+
+    def ensure_fresh(self):
+        if not self.is_due():
+            return
+        version = self._shared_version()
+        if not self._loaded or version != self._version:
+            self.load(version)
+        self._checked_at = time.monotonic()
+
+    def load(self, version=None):
+        exact, wildcard, by_pk = {}, {}, {}
+        rows = Domain.objects.values_list("pk", "domain", "tenant__schema_name")
+        for pk, domain, schema_name in rows.iterator():
+            domain = self.normalize(domain)
+            self._target(domain, exact, wildcard)[self._key(domain)] = schema_name
+            by_pk[pk] = domain
+        with self._lock:
+            self._exact, self._wildcard, self._by_pk = exact, wildcard, by_pk
+            self._version = version
+            self._loaded = True
+
+    def lookup(self, hostname):
+        hostname = self.normalize(hostname)
+        schema_name = self._exact.get(hostname)
+        if schema_name is not None:
+            return schema_name
+        labels = hostname.split(".")
+        for i in range(1, len(labels)):
+            schema_name = self._wildcard.get(".".join(labels[i:]))
+            if schema_name is not None:
+                return schema_name
+        return None
+
+    def update(self, domain):
+        normalized = self.normalize(domain.domain)
+        with self._lock:
+            self._discard(domain.pk)
+            self._target(normalized, self._exact, self._wildcard)[self._key(normalized)] = domain.tenant.schema_name
+            self._by_pk[domain.pk] = normalized
+        self._bump_version()
+
+    def remove(self, domain):
+        with self._lock:
+            self._discard(domain.pk)
+        self._bump_version()
+
+    def _discard(self, pk):
+        previous = self._by_pk.pop(pk, None)
+        if previous is not None:
+            self._target(previous, self._exact, self._wildcard).pop(self._key(previous), None)
+
+    @staticmethod
+    def _target(domain, exact, wildcard):
+        return wildcard if domain.startswith(WILDCARD_PREFIX) else exact
+
+    @staticmethod
+    def _key(domain):
+        return domain[len(WILDCARD_PREFIX):] if domain.startswith(WILDCARD_PREFIX) else domain
+
+    def _shared_version(self):
+        try:
+            return cache.get(VERSION_KEY)
+        except Exception:
+            logger.warning("Could not read the domain index version", exc_info=True)
+            return self._version
+
+    def _bump_version(self):
+        try:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.incr(VERSION_KEY)
+        except Exception:
+            logger.warning("Could not bump the domain index version", exc_info=True)
+            return
+        # Our own copy is already up to date; don't reload it for this bump.
+        if version == (self._version or 0) + 1:
+            self._version = version
+
+
+domain_index = DomainIndex(
+    check_interval=getattr(settings, "TENANT_DOMAIN_INDEX_CHECK_INTERVAL", 5),
+)
@@ -0,0 +1,100 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from authentication.models import User
+from tenant_permissions.models import Role, UserPermissions, UserRoles
+from tenants.models import Invitation
+
+CONTENT_TYPE = "application/x-ndjson"
+FORMAT_VERSION = 1
+
+
+def _sections(tenant):
+    """
+    (record type, schema, queryset factory, {output name: lookup}) of everything
+    exported, in order. Querysets are built lazily, inside their own schema.
+    """
+    public = get_public_schema_name()
+    schema = tenant.schema_name
+    return (
+        ("membership", public, lambda: User.tenant.through.objects.filter(tenant_id=tenant.pk), {
+            "id": "id", "user_id": "user_id", "email": "user__email", "first_name": "user__first_name",
+            "last_name": "user__last_name", "is_active": "user__is_active",
+        }),
+        ("invitation", public, lambda: Invitation.custom_manager.filter(tenant_id=tenant.pk), {
+            "id": "id", "email": "email", "invited_by_id": "invited_by_id", "is_accepted": "is_accepted",
+            "accepted_at": "accepted_at", "created_at": "created_at",
+        }),
+        ("role", schema, Role.objects.all, {"id": "id", "name": "name", "created_at": "created_at"}),
+        ("role_permission", schema, Role.permissions.through.objects.all, {
+            "id": "id", "role_id": "role_id", "app_label": "permission__content_type__app_label",
+            "codename": "permission__codename",
+        }),
+        ("user_roles", schema, UserRoles.objects.all, {"id": "id", "user_id": "user_id"}),
+        ("user_role", schema, UserRoles.roles.through.objects.all, {
+            "id": "id", "user_roles_id": "userroles_id", "role_id": "role_id",
+        }),
+        ("user_permissions", schema, UserPermissions.objects.all, {"id": "id", "user_id": "user_id"}),
+        ("user_permission", schema, UserPermissions.permissions.through.objects.all, {
+            "id": "id", "user_permissions_id": "userpermissions_id",
+            "app_label": "permission__content_type__app_label", "codename": "permission__codename",
+        }),
+    )
+
+
+def _rows(queryset, fields, chunk_size):
+    """
+    Streams ``fields`` (the first being "id") of every row, holding at most
+    ``chunk_size`` rows. Uses a server-side cursor where the connection allows
+    one; behind a transaction pooler, where they are disabled, pages by id
+    instead.
+    """
+    queryset = queryset.order_by("id").values_list(*fields)
+    if not connection.settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+    last_id = None
+    while True:
+        page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+def _line(record):
+    return (json.dumps(record, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n").encode()
+
+
+def export_tenant(tenant, chunk_size=None):
+    """
+    Yields the tenant's memberships, invitations, roles and permission
+    assignments as NDJSON lines: a header, then one ``{"type", "data"}``
+    record per row, then a footer with the row count of each type.
+    """
+    chunk_size = chunk_size or getattr(settings, "TENANT_EXPORT_CHUNK_SIZE", 2000)
+    yield _line({
+        "type": "header",
+        "data": {
+            "version": FORMAT_VERSION,
+            "tenant": tenant.name,
+            "schema_name": tenant.schema_name,
+            "exported_at": timezone.now(),
+        },
+    })
+    counts = {}
+    for record_type, schema, queryset, fields in _sections(tenant):
+        counts[record_type] = 0
+        # A streamed response is iterated after the view has returned, so the
+        # connection's schema can't be relied on; each section sets its own.
+        with schema_context(schema):
+            for row in _rows(queryset(), list(fields.values()), chunk_size):
+                counts[record_type] += 1
+                yield _line({"type": record_type, "data": dict(zip(fields, row))})
+    yield _line({"type": "footer", "data": {"counts": counts}})
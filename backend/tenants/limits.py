@@ -0,0 +1,161 @@
+import logging
+import math
+import threading
+import time
+import uuid
+from typing import NamedTuple
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket for the time since it was last touched, then grants up to
+# ARGV[4] tokens. Returns the tokens granted and, if none were, the seconds
+# until one is available.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(tonumber(ARGV[4]), math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+if granted > 0 then
+    return {granted, '0'}
+end
+return {0, tostring((1 - tokens) / rate)}
+"""
+
+# In-flight requests are members of a sorted set scored by start time; those
+# older than ARGV[4] seconds are assumed lost with their worker.
+CONCURRENCY_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[4]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class TenantLimits(NamedTuple):
+    rate: float
+    burst: int
+    concurrency: int
+
+    @classmethod
+    def for_tenant(cls, tenant):
+        """Defaults from settings, overridden by ``Tenant.settings["limits"]``."""
+        overrides = (tenant.settings or {}).get("limits") or {}
+        rate = float(overrides.get("rate", getattr(settings, "TENANT_RATE_LIMIT", 50)))
+        return cls(
+            rate=rate,
+            burst=int(overrides.get("burst", getattr(settings, "TENANT_RATE_LIMIT_BURST", 2 * rate))),
+            concurrency=int(overrides.get("concurrency", getattr(settings, "TENANT_CONCURRENCY_LIMIT", 0))),
+        )
+
+
+class Slot(NamedTuple):
+    key: str
+    member: str
+
+
+class TenantLimiter:
+    """
+    Per-tenant request rate (token bucket) and concurrency limits kept in Redis
+    so they hold across every worker. A rate or concurrency of 0 disables it.
+
+    Tokens are taken from Redis ``lease_size`` at a time and spent locally for
+    up to a second, and a tenant that was refused is refused locally until its
+    Retry-After, so most requests don't reach Redis for the rate limit. If
+    Redis is unavailable requests are let through.
+    """
+
+    def __init__(self, lease_size=5, slot_ttl=60):
+        self.lease_size = lease_size
+        self.slot_ttl = slot_ttl
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._blocked = {}
+        self._scripts = None
+
+    def scripts(self):
+        if self._scripts is None:
+            redis = get_redis_connection("default")
+            self._scripts = (redis.register_script(TOKEN_BUCKET_LUA), redis.register_script(CONCURRENCY_LUA))
+        return self._scripts
+
+    def acquire(self, tenant):
+        """
+        Returns ``(slot, retry_after)``. A request is refused when
+        ``retry_after`` is not None; otherwise pass ``slot`` to release() once
+        the response is ready.
+        """
+        limits = TenantLimits.for_tenant(tenant)
+        try:
+            if limits.rate > 0:
+                retry_after = self._take_token(tenant.schema_name, limits)
+                if retry_after is not None:
+                    return None, retry_after
+            if limits.concurrency > 0:
+                return self._take_slot(tenant.schema_name, limits)
+        except Exception:
+            logger.warning("Could not check the limits of tenant %s", tenant.schema_name, exc_info=True)
+        return None, None
+
+    def release(self, slot):
+        if slot is None:
+            return
+        try:
+            get_redis_connection("default").zrem(slot.key, slot.member)
+        except Exception:
+            logger.warning("Could not release a concurrency slot of %s", slot.key, exc_info=True)
+
+    def _take_token(self, schema_name, limits):
+        now = time.monotonic()
+        with self._lock:
+            blocked_until = self._blocked.get(schema_name)
+            if blocked_until is not None:
+                if now < blocked_until:
+                    return blocked_until - now
+                del self._blocked[schema_name]
+            lease = self._leases.get(schema_name)
+            if lease is not None and lease[0] > 0 and now < lease[1]:
+                lease[0] -= 1
+                return None
+        token_bucket, _ = self.scripts()
+        want = max(1, min(self.lease_size, limits.burst, int(limits.rate)))
+        granted, retry_after = token_bucket(
+            keys=[f"limits:rate:{schema_name}"], args=[limits.rate, limits.burst, time.time(), want]
+        )
+        granted, retry_after = int(granted), float(retry_after)
+        with self._lock:
+            if not granted:
+                self._blocked[schema_name] = now + retry_after
+                return retry_after
+            # One token is spent on this request; the rest stay local briefly.
+            self._leases[schema_name] = [granted - 1, now + 1.0]
+        return None
+
+    def _take_slot(self, schema_name, limits):
+        _, concurrency = self.scripts()
+        slot = Slot(f"limits:concurrency:{schema_name}", uuid.uuid4().hex)
+        if concurrency(keys=[slot.key], args=[limits.concurrency, time.time(), slot.member, self.slot_ttl]):
+            return slot, None
+        return None, 1.0
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+tenant_limiter = TenantLimiter(
+    lease_size=getattr(settings, "TENANT_RATE_LIMIT_LEASE", 5),
+    slot_ttl=getattr(settings, "TENANT_CONCURRENCY_SLOT_TTL", 60),
+)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tenants.template import build_template
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the template schema new tenants are cloned from, if it is out of date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild even if the template is current.")
+
+    def handle(self, *args, **options):
+        if build_template(force=options["force"], verbosity=options["verbosity"]):
+            self.stdout.write(self.style.SUCCESS("Tenant template rebuilt."))
+        else:
+            self.stdout.write("Tenant template is up to date or already being rebuilt.")
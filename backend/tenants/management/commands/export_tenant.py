@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tenants.export import export_tenant
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Writes a tenant's memberships, invitations, roles and permissions as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("schema_name")
+        parser.add_argument("-o", "--output", help="File to write to instead of stdout.")
+        parser.add_argument("--chunk-size", type=int, help="Rows fetched per round trip.")
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(schema_name=options["schema_name"])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"No tenant with schema {options['schema_name']!r}.")
+
+        lines = export_tenant(tenant, chunk_size=options["chunk_size"])
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line.decode(), ending="")
+            return
+        with open(options["output"], "wb") as output:
+            output.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(f"Exported {tenant.schema_name} to {options['output']}."))
@@ -0,0 +1,26 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from tenants.analytics import QUERIES, ndjson
+
+
+class Command(BaseCommand):
+    help = "Runs a cross-tenant analytics query, writing one row per line as it arrives."
+
+    def add_arguments(self, parser):
+        parser.add_argument("query", choices=sorted(QUERIES))
+        parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+
+    def handle(self, *args, **options):
+        rows = QUERIES[options["query"]]()
+        if options["format"] == "ndjson":
+            for line in ndjson(rows):
+                self.stdout.write(line.decode(), ending="")
+            return
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(self.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
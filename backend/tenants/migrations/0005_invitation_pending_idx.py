@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_pooledschema'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['email', 'is_accepted', '-id'], name='invitation_pending_idx'),
+        ),
+    ]
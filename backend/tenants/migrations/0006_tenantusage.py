@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0005_invitation_pending_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('requests', models.PositiveBigIntegerField(default=0)),
+                ('db_time_ms', models.FloatField(default=0)),
+                ('response_bytes', models.PositiveBigIntegerField(default=0)),
+                ('latency_ms', models.FloatField(default=0)),
+                ('latency_histogram', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='tenants.tenant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'period_start'), name='tenant_usage_period_unique')],
+            },
+        ),
+    ]
@@ -31,6 +31,18 @@ class Tenant(TenantMixin):
     def is_subscription_active(self):
         return self.paid_until >= date.today()
 
+    def get_base_schema(self):
+        # Only clone a template built from the current migrations: the clone is
+        # fake-migrated, so a stale one would silently miss newer migrations.
+        from tenants.tasks import rebuild_tenant_template
+        from tenants.template import template_is_current
+
+        base_schema = super().get_base_schema()
+        if not base_schema or template_is_current():
+            return base_schema
+        rebuild_tenant_template.delay()
+        return False
+
     class Meta:
         permissions = [
             ('can_change_tenant_info', 'Can change tenant information'),
@@ -115,3 +127,69 @@ class Invitation(models.Model):
 
     class Meta:
             unique_together = ('tenant', 'email')
+            indexes = [
+                # Pending invitations of a user, newest first (InvitationAPIView).
+                models.Index(fields=['email', 'is_accepted', '-id'], name='invitation_pending_idx'),
+            ]
+
+
+class ProvisioningStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    SUCCEEDED = 'succeeded', 'Succeeded'
+    FAILED = 'failed', 'Failed'
+
+
+class TenantProvisioning(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.OneToOneField('tenants.Tenant', related_name='provisioning', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='tenant_provisionings', null=True)
+    status = models.CharField(max_length=20, choices=ProvisioningStatus.choices, default=ProvisioningStatus.PENDING)
+    # {stage name: {"status": ..., "started_at": ..., "finished_at": ..., "error": ...}}
+    stages = models.JSONField(default=dict)
+    # Everything the stages need that isn't stored on the tenant, e.g. the invitation email.
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class TenantTeardown(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Cleared by the last stage, which deletes the tenant itself.
+    tenant = models.OneToOneField('tenants.Tenant', related_name='teardown', on_delete=models.SET_NULL, null=True)
+    schema_name = models.CharField(max_length=63)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='tenant_teardowns', null=True)
+    status = models.CharField(max_length=20, choices=ProvisioningStatus.choices, default=ProvisioningStatus.PENDING)
+    # Same shape as TenantProvisioning.stages, plus the rows each stage has deleted.
+    stages = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class PooledSchema(models.Model):
+    # A migrated and seeded schema waiting to be claimed by a new tenant.
+    schema_name = models.CharField(max_length=63, unique=True)
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class TenantUsage(models.Model):
+    # Hourly usage of one tenant, rolled up from Redis by tenants.usage.rollup().
+    tenant = models.ForeignKey('tenants.Tenant', related_name='usage', on_delete=models.CASCADE)
+    period_start = models.DateTimeField()
+    requests = models.PositiveBigIntegerField(default=0)
+    db_time_ms = models.FloatField(default=0)
+    response_bytes = models.PositiveBigIntegerField(default=0)
+    latency_ms = models.FloatField(default=0)
+    # Request counts per latency bucket, keyed "le_<ms>" and "le_inf".
+    latency_histogram = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'period_start'], name='tenant_usage_period_unique'),
+        ]
@@ -0,0 +1,118 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django_tenants.clone import CloneSchema
+from django_tenants.utils import get_tenant_base_schema, schema_context, schema_exists
+
+from tenants.models import PooledSchema
+from tenants.seeding import seed_tenant_schema
+from tenants.template import build_template, current_fingerprint, template_is_current
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "tenant:pool:lock"
+SCHEMA_PREFIX = "pool_"
+
+
+def pool_size():
+    return getattr(settings, "TENANT_SCHEMA_POOL_SIZE", 10)
+
+
+def claim_schema(schema_name):
+    """
+    Renames a pooled schema to ``schema_name``. Returns False if none is
+    available. Must run inside the transaction that saves the tenant, so a
+    rollback puts the schema back in the pool.
+    """
+    if not pool_size():
+        return False
+    pooled = (
+        PooledSchema.objects.select_for_update(skip_locked=True)
+        .filter(fingerprint=current_fingerprint())
+        .order_by("created_at")
+        .first()
+    )
+    if pooled is not None:
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER SCHEMA {qn(pooled.schema_name)} RENAME TO {qn(schema_name)}")
+        pooled.delete()
+    from tenants.tasks import refill_schema_pool
+    transaction.on_commit(refill_schema_pool.delay)
+    return pooled is not None
+
+
+def _drop_schema(schema_name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {connection.ops.quote_name(schema_name)} CASCADE")
+
+
+def _create_pooled_schema():
+    schema_name = f"{SCHEMA_PREFIX}{uuid.uuid4().hex}"
+    try:
+        if template_is_current():
+            # The template is already migrated and seeded, and the clone
+            # carries its django_migrations rows along.
+            CloneSchema().clone_schema(get_tenant_base_schema(), schema_name)
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(f"CREATE SCHEMA {connection.ops.quote_name(schema_name)}")
+            call_command(
+                "migrate_schemas",
+                tenant=True,
+                schema_name=schema_name,
+                interactive=False,
+                verbosity=0,
+            )
+            with schema_context(schema_name):
+                seed_tenant_schema()
+        PooledSchema.objects.create(schema_name=schema_name, fingerprint=current_fingerprint())
+    except Exception:
+        if schema_exists(schema_name):
+            _drop_schema(schema_name)
+        raise
+    return schema_name
+
+
+def drop_stale():
+    """Drops pooled schemas built from older migrations or seed data."""
+    dropped = 0
+    for pooled in PooledSchema.objects.exclude(fingerprint=current_fingerprint()):
+        with transaction.atomic():
+            if PooledSchema.objects.filter(pk=pooled.pk).select_for_update(skip_locked=True).exists():
+                _drop_schema(pooled.schema_name)
+                pooled.delete()
+                dropped += 1
+    return dropped
+
+
+def refill():
+    """
+    Tops the pool up to TENANT_SCHEMA_POOL_SIZE once it falls to
+    TENANT_SCHEMA_POOL_LOW_WATER. Returns the number of schemas created.
+    """
+    size = pool_size()
+    if not size:
+        return 0
+    timeout = getattr(settings, "TENANT_TEMPLATE_BUILD_TIMEOUT", 30 * 60)
+    if not cache.add(LOCK_KEY, 1, timeout):
+        return 0
+    created = 0
+    try:
+        drop_stale()
+        available = PooledSchema.objects.filter(fingerprint=current_fingerprint()).count()
+        if available > getattr(settings, "TENANT_SCHEMA_POOL_LOW_WATER", 3) or available >= size:
+            return 0
+        build_template()
+        for _ in range(size - available):
+            _create_pooled_schema()
+            created += 1
+    finally:
+        cache.delete(LOCK_KEY)
+        if created:
+            logger.info("Added %d schemas to the tenant schema pool", created)
+    return created
@@ -0,0 +1,112 @@
+from django.core.management import call_command
+from django.utils import timezone
+from django_tenants.signals import post_schema_sync
+from django_tenants.utils import schema_context, schema_exists
+
+from authentication.utils import Util
+from tenants.models import ProvisioningStatus, TenantProvisioning
+from tenants.seeding import TENANT_ADMIN_ROLE, seed_tenant_schema
+from tenant_permissions.models import Role, UserRoles
+
+
+def _create_or_migrate(tenant):
+    if schema_exists(tenant.schema_name):
+        # A previous attempt got as far as creating the schema; migrating it
+        # again finishes whatever that attempt left undone.
+        call_command(
+            "migrate_schemas",
+            tenant=True,
+            schema_name=tenant.schema_name,
+            interactive=False,
+            verbosity=0,
+        )
+    else:
+        tenant.create_schema(check_if_exists=True, verbosity=0)
+
+
+def create_schema(provisioning):
+    tenant = provisioning.tenant
+    # Schemas claimed from the warm pool are already migrated and seeded.
+    if not provisioning.payload.get("from_pool"):
+        _create_or_migrate(tenant)
+    post_schema_sync.send(sender=tenant.__class__, tenant=tenant.serializable_fields())
+
+
+def seed_schema(provisioning):
+    with schema_context(provisioning.tenant.schema_name):
+        timings = seed_tenant_schema()
+    return {"fixtures": timings} if timings else None
+
+
+def assign_admin(provisioning):
+    if provisioning.requested_by_id is None:
+        return
+    with schema_context(provisioning.tenant.schema_name):
+        user_roles, _ = UserRoles.objects.get_or_create(user_id=provisioning.requested_by_id)
+        user_roles.roles.add(Role.objects.get(name=TENANT_ADMIN_ROLE))
+
+
+def send_invitation(provisioning):
+    email = provisioning.payload.get("invitation_email")
+    if email:
+        Util.send_email(email)
+
+
+STAGES = [
+    ("create_schema", create_schema),
+    ("seed", seed_schema),
+    ("assign_admin", assign_admin),
+    ("send_invitation", send_invitation),
+]
+
+
+def _save(provisioning, *fields):
+    provisioning.save(update_fields=[*fields, "updated_at"])
+
+
+def run(provisioning, stages=STAGES):
+    """
+    Runs every stage that has not completed yet. Stages are idempotent, so a
+    retry after a failure resumes from the stage that failed. Also runs
+    tenant teardowns, which record their stages the same way.
+    """
+    provisioning.status = ProvisioningStatus.RUNNING
+    provisioning.attempts += 1
+    provisioning.error = ""
+    _save(provisioning, "status", "attempts", "error")
+    for name, stage in stages:
+        state = provisioning.stages.get(name, {})
+        if state.get("status") == ProvisioningStatus.SUCCEEDED:
+            continue
+        state.update(status=ProvisioningStatus.RUNNING, started_at=timezone.now().isoformat(), error="")
+        provisioning.stages[name] = state
+        _save(provisioning, "stages")
+        try:
+            result = stage(provisioning)
+        except Exception as exc:
+            state.update(status=ProvisioningStatus.FAILED, error=str(exc))
+            provisioning.error = f"{name}: {exc}"
+            _save(provisioning, "stages", "error")
+            raise
+        state.update(result or {}, status=ProvisioningStatus.SUCCEEDED, finished_at=timezone.now().isoformat())
+        _save(provisioning, "stages")
+    provisioning.status = ProvisioningStatus.SUCCEEDED
+    _save(provisioning, "status")
+
+
+def mark_failed(provisioning_id):
+    TenantProvisioning.objects.filter(pk=provisioning_id).update(
+        status=ProvisioningStatus.FAILED, updated_at=timezone.now()
+    )
+
+
+def progress(provisioning, stages=STAGES):
+    stages = [
+        {"name": name, "status": ProvisioningStatus.PENDING, **provisioning.stages.get(name, {})}
+        for name, _ in stages
+    ]
+    return {
+        "completed": sum(stage["status"] == ProvisioningStatus.SUCCEEDED for stage in stages),
+        "total": len(stages),
+        "stages": stages,
+    }
@@ -0,0 +1,105 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core import serializers
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.db import connection, router, transaction
+
+from tenant_permissions.models import Role
+
+logger = logging.getLogger(__name__)
+
+TENANT_ADMIN_ROLE = "TENANT_ADMIN"
+TENANT_ADMIN_PERMISSIONS = ["can_change_tenant_info"]
+SEED_FIXTURES = ["asset_type.json", "complience_options.json"]
+
+
+def fixture_paths(name):
+    dirs = [os.path.join(config.path, "fixtures") for config in apps.get_app_configs()]
+    dirs += [str(path) for path in getattr(settings, "FIXTURE_DIRS", ())]
+    return sorted(
+        os.path.join(directory, name)
+        for directory in dirs
+        if os.path.isfile(os.path.join(directory, name))
+    )
+
+
+@lru_cache(maxsize=None)
+def parse_fixture(name):
+    """
+    Finds, parses and validates a fixture once per process. Returns its
+    DeserializedObjects; they are only used as templates for the rows
+    insert_fixture() creates.
+    """
+    paths = fixture_paths(name)
+    if not paths:
+        raise CommandError(f"No fixture named '{name}' found.")
+    objects = []
+    for path in paths:
+        with open(path, "rb") as f:
+            objects.extend(serializers.deserialize("json", f))
+    return tuple(objects)
+
+
+def _copy(instance):
+    return type(instance)(
+        **{field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+    )
+
+
+def insert_fixture(name):
+    """Bulk inserts a parsed fixture into the current schema."""
+    rows = defaultdict(list)
+    through_rows = defaultdict(list)
+    for obj in parse_fixture(name):
+        model = type(obj.object)
+        if not router.allow_migrate_model(connection.alias, model):
+            continue
+        rows[model].append(_copy(obj.object))
+        for field_name, values in (obj.m2m_data or {}).items():
+            field = model._meta.get_field(field_name)
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            through_rows[through].extend(through(**{source: obj.object.pk, target: value}) for value in values)
+    batch_size = getattr(settings, "TENANT_SEED_BATCH_SIZE", 1000)
+    for model, instances in [*rows.items(), *through_rows.items()]:
+        model._default_manager.bulk_create(instances, batch_size=batch_size)
+    # Fixture rows carry explicit primary keys, so move the sequences past them.
+    sequence_sql = connection.ops.sequence_reset_sql(no_style(), list(rows))
+    if sequence_sql:
+        with connection.cursor() as cursor:
+            for sql in sequence_sql:
+                cursor.execute(sql)
+
+
+def is_seeded():
+    return Role.objects.filter(name=TENANT_ADMIN_ROLE).exists()
+
+
+@transaction.atomic
+def seed_tenant_schema():
+    """
+    Loads the data every new tenant starts with into the current schema and
+    returns the seconds each fixture took. Schemas cloned from the template
+    are already seeded and are skipped, returning None.
+    """
+    if is_seeded():
+        return None
+    timings = {}
+    for fixture in SEED_FIXTURES:
+        started = time.perf_counter()
+        insert_fixture(fixture)
+        timings[fixture] = round(time.perf_counter() - started, 4)
+        logger.info("Seeded %s into %s in %.4fs", fixture, connection.schema_name, timings[fixture])
+    # Created last: its presence marks the schema as fully seeded.
+    role = Role.objects.create(name=TENANT_ADMIN_ROLE)
+    role.permissions.add(*Permission.objects.filter(codename__in=TENANT_ADMIN_PERMISSIONS))
+    return timings
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from tenants.models import Tenant, Invitation
+from tenants import pool, provisioning, teardown
+from tenants.models import Tenant, Invitation, TenantProvisioning, TenantTeardown
 import uuid
 from authentication.models import User
 from rest_framework.exceptions import ValidationError
@@ -18,9 +19,37 @@ class TenantSerializer(serializers.ModelSerializer):
         validated_data['schema_name'] = str(uuid.uuid4())
         validated_data.pop('redirect_url', None)
 
-        tenant = Tenant.objects.create(**validated_data)
+        tenant = Tenant(**validated_data)
+        # Take a ready schema from the warm pool if there is one; otherwise the
+        # provisioning task creates it, not the request.
+        tenant.from_pool = pool.claim_schema(tenant.schema_name)
+        tenant.auto_create_schema = False
+        tenant.save()
         return tenant
 
+
+class TenantProvisioningSerializer(serializers.ModelSerializer):
+    schema_name = serializers.CharField(source='tenant.schema_name', read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TenantProvisioning
+        fields = ['id', 'schema_name', 'status', 'progress', 'attempts', 'error', 'created_at', 'updated_at']
+
+    def get_progress(self, obj):
+        return provisioning.progress(obj)
+
+
+class TenantTeardownSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TenantTeardown
+        fields = ['id', 'schema_name', 'status', 'progress', 'attempts', 'error', 'created_at', 'updated_at']
+
+    def get_progress(self, obj):
+        return teardown.progress(obj)
+
 class InvitationSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(required=True)
     tenant = TenantSerializer(read_only=True)
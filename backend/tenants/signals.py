@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from tenants.cache import invalidate_tenant
+from tenants.domains import domain_index
+from tenants.models import Domain, Tenant
+from tenants.usage import time_queries
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_cache(sender, instance, **kwargs):
+    # Also after the commit, in case another process cached the old row in between.
+    invalidate_tenant(instance.schema_name)
+    transaction.on_commit(lambda: invalidate_tenant(instance.schema_name))
+
+
+@receiver(post_save, sender=Domain)
+def index_domain(sender, instance, **kwargs):
+    domain_index.update(instance)
+
+
+@receiver(post_delete, sender=Domain)
+def unindex_domain(sender, instance, **kwargs):
+    domain_index.remove(instance)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
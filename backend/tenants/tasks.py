@@ -0,0 +1,55 @@
+from celery import shared_task
+from django.conf import settings
+
+from tenants import pool, provisioning, teardown, usage
+from tenants.models import TenantProvisioning, TenantTeardown
+from tenants.template import build_template
+
+
+@shared_task
+def rebuild_tenant_template(force=False):
+    return build_template(force=force)
+
+
+@shared_task
+def refill_schema_pool():
+    return pool.refill()
+
+
+@shared_task
+def rollup_tenant_usage():
+    return usage.rollup()
+
+
+@shared_task(
+    bind=True,
+    max_retries=getattr(settings, "TENANT_PROVISIONING_MAX_RETRIES", 5),
+    soft_time_limit=getattr(settings, "TENANT_PROVISIONING_TIME_LIMIT", 15 * 60),
+    time_limit=getattr(settings, "TENANT_PROVISIONING_TIME_LIMIT", 15 * 60) + 60,
+)
+def provision_tenant(self, provisioning_id):
+    instance = TenantProvisioning.objects.select_related("tenant").get(pk=provisioning_id)
+    try:
+        provisioning.run(instance)
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            provisioning.mark_failed(provisioning_id)
+            raise
+        raise self.retry(exc=exc, countdown=2 ** self.request.retries * 5)
+
+
+@shared_task(
+    bind=True,
+    max_retries=getattr(settings, "TENANT_TEARDOWN_MAX_RETRIES", 5),
+    soft_time_limit=getattr(settings, "TENANT_TEARDOWN_TIME_LIMIT", 60 * 60),
+    time_limit=getattr(settings, "TENANT_TEARDOWN_TIME_LIMIT", 60 * 60) + 60,
+)
+def teardown_tenant(self, teardown_id):
+    instance = TenantTeardown.objects.select_related("tenant").get(pk=teardown_id)
+    try:
+        teardown.run(instance)
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            teardown.mark_failed(teardown_id)
+            raise
+        raise self.retry(exc=exc, countdown=2 ** self.request.retries * 5)
@@ -0,0 +1,138 @@
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+
+from authentication.models import User
+from tenants import provisioning
+from tenants.models import Invitation, ProvisioningStatus, StatusChoices, TenantTeardown, TenantUsage
+
+
+def _retrying(operation):
+    """
+    Runs ``operation`` in a transaction that gives up waiting for locks after
+    TENANT_TEARDOWN_LOCK_TIMEOUT ms, retrying with exponential backoff so a
+    teardown waits for other tenants' traffic rather than the reverse.
+    Returns the seconds the successful attempt took.
+    """
+    retries = getattr(settings, "TENANT_TEARDOWN_LOCK_RETRIES", 5)
+    lock_timeout = f"{getattr(settings, 'TENANT_TEARDOWN_LOCK_TIMEOUT', 2000)}ms"
+    for attempt in range(retries + 1):
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                _execute("SET LOCAL lock_timeout = %s", [lock_timeout])
+                operation()
+            return time.monotonic() - started
+        except OperationalError:
+            if attempt == retries:
+                raise
+            time.sleep(getattr(settings, "TENANT_TEARDOWN_BATCH_PAUSE", 0.05) * 2 ** (attempt + 1))
+
+
+def _execute(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _record(teardown, name, **counts):
+    teardown.stages[name].update(counts)
+    teardown.save(update_fields=["stages", "updated_at"])
+
+
+def _delete_in_batches(teardown, name, queryset):
+    model = queryset.model
+    batch_size = getattr(settings, "TENANT_TEARDOWN_BATCH_SIZE", 500)
+    deleted = teardown.stages[name].get("deleted", 0)
+    while True:
+        pks = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return
+        elapsed = _retrying(lambda: model._base_manager.filter(pk__in=pks).delete())
+        deleted += len(pks)
+        _record(teardown, name, deleted=deleted)
+        # Pause for at least as long as the batch held its locks.
+        time.sleep(max(getattr(settings, "TENANT_TEARDOWN_BATCH_PAUSE", 0.05), elapsed))
+
+
+def delete_invitations(teardown):
+    _delete_in_batches(
+        teardown, "delete_invitations", Invitation.custom_manager.filter(tenant_id=teardown.tenant_id)
+    )
+
+
+def delete_memberships(teardown):
+    _delete_in_batches(
+        teardown, "delete_memberships", User.tenant.through.objects.filter(tenant_id=teardown.tenant_id)
+    )
+
+
+def delete_usage(teardown):
+    _delete_in_batches(teardown, "delete_usage", TenantUsage.objects.filter(tenant_id=teardown.tenant_id))
+
+
+def drop_schema(teardown):
+    # One table per transaction, so no lock is held on more than one table
+    # at a time; the empty schema is dropped last.
+    qn = connection.ops.quote_name
+    schema_name = teardown.schema_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = %s", [schema_name])
+        tables = [row[0] for row in cursor.fetchall()]
+    dropped = teardown.stages["drop_schema"].get("dropped_tables", 0)
+    for table in tables:
+        _retrying(lambda: _execute(f"DROP TABLE IF EXISTS {qn(schema_name)}.{qn(table)} CASCADE"))
+        dropped += 1
+        _record(teardown, "drop_schema", dropped_tables=dropped, remaining_tables=len(tables) - dropped)
+    _retrying(lambda: _execute(f"DROP SCHEMA IF EXISTS {qn(schema_name)} CASCADE"))
+
+
+@transaction.atomic
+def delete_tenant(teardown):
+    tenant = teardown.tenant
+    if tenant is None:
+        return
+    # The schema is already gone; this removes the tenant row and what still
+    # cascades from it (domains, provisioning).
+    tenant.auto_drop_schema = False
+    tenant.delete()
+
+
+STAGES = [
+    ("delete_invitations", delete_invitations),
+    ("delete_memberships", delete_memberships),
+    ("delete_usage", delete_usage),
+    ("drop_schema", drop_schema),
+    ("delete_tenant", delete_tenant),
+]
+
+
+def start(tenant, requested_by_id):
+    """
+    Takes the tenant out of service immediately and records its teardown.
+    Returns ``(teardown, created)``; the caller queues teardown_tenant for a
+    new one once the transaction commits.
+    """
+    if tenant.schema_name == get_public_schema_name():
+        raise ValueError("The public tenant can't be torn down.")
+    if tenant.tenant_status != StatusChoices.INACTIVE:
+        tenant.tenant_status = StatusChoices.INACTIVE
+        tenant.save(update_fields=["tenant_status", "last_updated"])
+    return TenantTeardown.objects.get_or_create(
+        tenant=tenant, defaults={"schema_name": tenant.schema_name, "requested_by_id": requested_by_id}
+    )
+
+
+def run(teardown):
+    connection.set_schema_to_public()
+    provisioning.run(teardown, STAGES)
+
+
+def mark_failed(teardown_id):
+    TenantTeardown.objects.filter(pk=teardown_id).update(status=ProvisioningStatus.FAILED, updated_at=timezone.now())
+
+
+def progress(teardown):
+    return provisioning.progress(teardown, STAGES)
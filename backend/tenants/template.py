@@ -0,0 +1,93 @@
+import hashlib
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django_tenants.utils import get_tenant_base_schema, schema_context, schema_exists
+
+from tenants.seeding import SEED_FIXTURES, fixture_paths, seed_tenant_schema
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "tenant:template:lock"
+
+
+@lru_cache(maxsize=None)
+def current_fingerprint():
+    """
+    Hash of everything a freshly provisioned schema depends on: the leaf
+    migration of every app and the seed fixtures. Migrations only change with
+    a deploy, so it is computed once per process.
+    """
+    digest = hashlib.sha256()
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    for app_label, name in sorted(loader.graph.leaf_nodes()):
+        digest.update(f"{app_label}.{name}\n".encode())
+    for fixture in SEED_FIXTURES:
+        digest.update(f"{fixture}\n".encode())
+        for path in fixture_paths(fixture):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def template_fingerprint(schema_name):
+    # Stored as the schema's comment, so it is replaced together with the schema.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT obj_description(oid, 'pg_namespace') FROM pg_namespace WHERE nspname = %s",
+            [schema_name],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def template_is_current():
+    base_schema = get_tenant_base_schema()
+    return bool(base_schema) and template_fingerprint(base_schema) == current_fingerprint()
+
+
+def build_template(force=False, verbosity=0):
+    """
+    Migrates and seeds a staging schema, then swaps it in for the template.
+    Returns False if the template is already current or another process is
+    building it.
+    """
+    base_schema = get_tenant_base_schema()
+    if not force and template_is_current():
+        return False
+    timeout = getattr(settings, "TENANT_TEMPLATE_BUILD_TIMEOUT", 30 * 60)
+    if not cache.add(LOCK_KEY, 1, timeout):
+        return False
+    staging = f"{base_schema}_next"
+    qn = connection.ops.quote_name
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {qn(staging)} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {qn(staging)}")
+        call_command(
+            "migrate_schemas",
+            tenant=True,
+            schema_name=staging,
+            interactive=False,
+            verbosity=verbosity,
+        )
+        with schema_context(staging):
+            seed_tenant_schema()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {qn(base_schema)} CASCADE")
+            cursor.execute(f"ALTER SCHEMA {qn(staging)} RENAME TO {qn(base_schema)}")
+            cursor.execute(f"COMMENT ON SCHEMA {qn(base_schema)} IS '{current_fingerprint()}'")
+    except Exception:
+        if schema_exists(staging):
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {qn(staging)} CASCADE")
+        raise
+    finally:
+        cache.delete(LOCK_KEY)
+    logger.info("Rebuilt tenant template schema %s", base_schema)
+    return True
@@ -1,3 +1,371 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django_tenants.utils import schema_exists
+
+from authentication.models import User
+from core.testing import LOCMEM_CACHE, TenantAPITestCase
+from tenant_permissions.models import Role
+from tenants import analytics, pool, provisioning, seeding, teardown
+from tenants.domains import DomainIndex
+from tenants.export import export_tenant
+from tenants.limits import TenantLimiter, retry_after_header
+from tenants.models import Invitation, PooledSchema, ProvisioningStatus, StatusChoices, Tenant
+from tenants.usage import UsageMeter
+
+
+class UsageMeterTests(SimpleTestCase):
+    def setUp(self):
+        self.meter = UsageMeter(flush_interval=3600)
+        # Flushing is driven by the tests, not the background thread.
+        self.meter._ensure_flusher = lambda: None
+        patcher = mock.patch("tenants.usage.get_redis_connection")
+        self.pipe = patcher.start().return_value.pipeline.return_value
+        self.addCleanup(patcher.stop)
+
+    def increments(self):
+        return {(call.args[0], call.args[1]): call.args[2] for call in self.pipe.hincrby.call_args_list}
+
+    def test_flush_collects_counts_of_idle_threads_in_the_hour_they_were_served(self):
+        with mock.patch("tenants.usage.time.time", return_value=7200 + 59):
+            worker = threading.Thread(target=self.meter.record, args=("acme", 0.02, 0.005, 512))
+            worker.start()
+            worker.join()
+            self.meter.record("acme", 0.2, 0.0, 0)
+
+        with mock.patch("tenants.usage.time.time", return_value=5 * 3600):
+            self.assertEqual(self.meter.flush(), 1)
+
+        increments = self.increments()
+        self.assertEqual(increments[("usage:7200:acme", "requests")], 2)
+        self.assertEqual(increments[("usage:7200:acme", "response_bytes")], 512)
+        self.assertEqual(increments[("usage:7200:acme", "le_25")], 1)
+        self.assertEqual(increments[("usage:7200:acme", "le_250")], 1)
+        # The finished thread's buffer is dropped once drained.
+        self.assertEqual(len(self.meter._buffers), 1)
+        self.assertEqual(self.meter.flush(), 0)
+
+    @mock.patch("tenants.usage.time.time", return_value=3600)
+    def test_failed_flush_is_retried(self, _):
+        self.meter.record("acme", 0.01, 0.0, 10)
+        self.pipe.execute.side_effect = ConnectionError
+        with self.assertLogs("tenants.usage", "WARNING"):
+            self.assertEqual(self.meter.flush(), 0)
+
+        self.pipe.reset_mock()
+        self.pipe.execute.side_effect = None
+        self.meter.record("acme", 0.01, 0.0, 10)
+        self.assertEqual(self.meter.flush(), 1)
+        self.assertEqual(self.increments()[("usage:3600:acme", "requests")], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DomainIndexTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.rows = [(1, "Acme.example.com.", "acme"), (2, "*.globex.example.com", "globex")]
+        patcher = mock.patch("tenants.domains.Domain.objects.values_list")
+        patcher.start().return_value.iterator.side_effect = lambda: iter(self.rows)
+        self.addCleanup(patcher.stop)
+
+    def test_exact_domains_win_over_wildcards(self):
+        self.rows.append((3, "shop.globex.example.com", "globex_shop"))
+        index = DomainIndex()
+        index.ensure_fresh()
+        self.assertEqual(index.lookup("acme.example.com"), "acme")
+        self.assertEqual(index.lookup("shop.globex.example.com"), "globex_shop")
+        self.assertEqual(index.lookup("a.b.globex.example.com"), "globex")
+        self.assertIsNone(index.lookup("globex.example.com"))
+
+    def test_changes_reach_other_processes(self):
+        # Two instances stand in for two worker processes sharing the cache.
+        here, there = DomainIndex(check_interval=0), DomainIndex(check_interval=0)
+        here.ensure_fresh()
+        there.ensure_fresh()
+
+        domain = mock.Mock(pk=4, domain="initech.example.com")
+        domain.tenant.schema_name = "initech"
+        here.update(domain)
+        self.assertEqual(here.lookup("initech.example.com"), "initech")
+
+        self.rows.append((4, "initech.example.com", "initech"))
+        there.ensure_fresh()
+        self.assertEqual(there.lookup("initech.example.com"), "initech")
+
+
+@override_settings(TENANT_BASE_SCHEMA="tenant_template")
+class TemplateCloneTests(SimpleTestCase):
+    @mock.patch("tenants.tasks.rebuild_tenant_template.delay")
+    def test_current_template_is_cloned(self, rebuild):
+        with (
+            mock.patch("tenants.template.template_fingerprint", return_value="abc"),
+            mock.patch("tenants.template.current_fingerprint", return_value="abc"),
+        ):
+            self.assertEqual(Tenant(schema_name="acme").get_base_schema(), "tenant_template")
+        rebuild.assert_not_called()
+
+    @mock.patch("tenants.tasks.rebuild_tenant_template.delay")
+    def test_stale_template_is_migrated_instead_and_rebuilt(self, rebuild):
+        with (
+            mock.patch("tenants.template.template_fingerprint", return_value="old"),
+            mock.patch("tenants.template.current_fingerprint", return_value="abc"),
+        ):
+            self.assertFalse(Tenant(schema_name="acme").get_base_schema())
+        rebuild.assert_called_once_with()
+
+
+class ProvisioningRunTests(SimpleTestCase):
+    def test_retry_resumes_from_the_failed_stage(self):
+        record = mock.Mock(stages={}, attempts=0)
+        calls = []
+        failures = [RuntimeError("database went away")]
+
+        def create(instance):
+            calls.append("create")
+
+        def seed(instance):
+            calls.append("seed")
+            if failures:
+                raise failures.pop()
+            return {"rows": 3}
+
+        stages = [("create", create), ("seed", seed)]
+        with self.assertRaises(RuntimeError):
+            provisioning.run(record, stages)
+        self.assertEqual(record.error, "seed: database went away")
+        self.assertEqual(provisioning.progress(record, stages)["completed"], 1)
+
+        provisioning.run(record, stages)
+        self.assertEqual(calls, ["create", "seed", "seed"])
+        self.assertEqual((record.status, record.attempts), (ProvisioningStatus.SUCCEEDED, 2))
+        self.assertEqual(record.stages["seed"]["rows"], 3)
+        self.assertEqual(provisioning.progress(record, stages)["completed"], 2)
+
+
+@override_settings(TENANT_SCHEMA_POOL_SIZE=2)
+@mock.patch("tenants.pool.current_fingerprint", return_value="abc")
+class SchemaPoolTests(TestCase):
+    def test_claim_renames_a_pooled_schema(self, _):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE SCHEMA pool_test")
+        PooledSchema.objects.create(schema_name="pool_test", fingerprint="abc")
+        PooledSchema.objects.create(schema_name="pool_stale", fingerprint="old")
+
+        with mock.patch("tenants.tasks.refill_schema_pool.delay") as refill:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(pool.claim_schema("claimed"))
+        refill.assert_called_once_with()
+        self.assertTrue(schema_exists("claimed"))
+        self.assertFalse(schema_exists("pool_test"))
+        self.assertEqual(list(PooledSchema.objects.values_list("schema_name", flat=True)), ["pool_stale"])
+
+        # Only schemas built from the current migrations are handed out.
+        self.assertFalse(pool.claim_schema("another"))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TENANT_SCHEMA_POOL_SIZE=2, TENANT_SCHEMA_POOL_LOW_WATER=3)
+@mock.patch("tenants.pool.drop_stale")
+@mock.patch("tenants.pool.build_template")
+@mock.patch("tenants.pool._create_pooled_schema")
+class SchemaPoolRefillTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("tenants.pool.PooledSchema.objects.filter")
+        self.available = patcher.start().return_value.count
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("tenants.pool.current_fingerprint", return_value="abc")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_full_pool_below_the_low_water_mark_builds_nothing(self, create, build_template, _):
+        self.available.return_value = 3
+        self.assertEqual(pool.refill(), 0)
+        build_template.assert_not_called()
+        create.assert_not_called()
+
+    def test_returns_the_schemas_actually_created(self, create, build_template, _):
+        self.available.return_value = 0
+        create.side_effect = [None, RuntimeError("disk full")]
+        with self.assertLogs("tenants.pool", "INFO") as logs, self.assertRaises(RuntimeError):
+            pool.refill()
+        self.assertIn("Added 1 schemas", logs.output[0])
+
+        create.side_effect = None
+        self.available.return_value = 1
+        self.assertEqual(pool.refill(), 1)
+
+
+class SeedFixtureTests(SimpleTestCase):
+    def setUp(self):
+        fixture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(fixture_dir.cleanup)
+        with open(f"{fixture_dir.name}/roles.json", "w") as f:
+            json.dump(
+                [
+                    {"model": "tenant_permissions.role", "pk": 1, "fields": {"name": "VIEWER", "permissions": [7, 8]}},
+                    {"model": "tenant_permissions.role", "pk": 2, "fields": {"name": "EDITOR", "permissions": []}},
+                ],
+                f,
+            )
+        settings = override_settings(FIXTURE_DIRS=[fixture_dir.name])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        seeding.parse_fixture.cache_clear()
+        self.addCleanup(seeding.parse_fixture.cache_clear)
+
+    @mock.patch("tenants.seeding.router.allow_migrate_model", return_value=True)
+    @mock.patch("tenants.seeding.connection.ops.sequence_reset_sql", return_value=[])
+    def test_fixture_is_parsed_once_and_bulk_inserted(self, *_):
+        with mock.patch("django.db.models.query.QuerySet.bulk_create") as bulk_create:
+            seeding.insert_fixture("roles.json")
+            seeding.insert_fixture("roles.json")
+        self.assertEqual(seeding.parse_fixture.cache_info().misses, 1)
+
+        roles, role_permissions = bulk_create.call_args_list[:2]
+        self.assertEqual([role.name for role in roles.args[0]], ["VIEWER", "EDITOR"])
+        through = Role.permissions.through
+        self.assertEqual(
+            [(row.role_id, row.permission_id) for row in role_permissions.args[0]], [(1, 7), (1, 8)]
+        )
+        self.assertIsInstance(role_permissions.args[0][0], through)
+        # Each insert gets its own copies of the parsed rows.
+        self.assertIsNot(roles.args[0][0], bulk_create.call_args_list[2].args[0][0])
+
+
+@override_settings(TENANT_RATE_LIMIT=10, TENANT_RATE_LIMIT_BURST=10, TENANT_CONCURRENCY_LIMIT=0)
+class TenantLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = TenantLimiter(lease_size=5)
+        self.token_bucket = mock.Mock()
+        self.concurrency = mock.Mock()
+        self.limiter._scripts = (self.token_bucket, self.concurrency)
+        self.tenant = mock.Mock(schema_name="acme", settings=None)
+
+    def test_leased_tokens_are_spent_locally_until_refused(self):
+        self.token_bucket.side_effect = [[5, "0"], [0, "2.5"]]
+        for _ in range(5):
+            self.assertEqual(self.limiter.acquire(self.tenant), (None, None))
+        self.assertEqual(self.token_bucket.call_count, 1)
+
+        slot, retry_after = self.limiter.acquire(self.tenant)
+        self.assertAlmostEqual(retry_after, 2.5)
+        self.assertEqual(retry_after_header(retry_after), "3")
+        # Refused locally until Retry-After, without asking Redis again.
+        self.assertIsNotNone(self.limiter.acquire(self.tenant)[1])
+        self.assertEqual(self.token_bucket.call_count, 2)
+
+    def test_per_tenant_concurrency_override(self):
+        self.tenant.settings = {"limits": {"rate": 0, "concurrency": 2}}
+        self.concurrency.side_effect = [1, 0]
+        slot, retry_after = self.limiter.acquire(self.tenant)
+        self.assertEqual((slot.key, retry_after), ("limits:concurrency:acme", None))
+        self.assertEqual(self.concurrency.call_args.kwargs["args"][0], 2)
+        self.assertEqual(self.limiter.acquire(self.tenant), (None, 1.0))
+        self.token_bucket.assert_not_called()
+
+    def test_requests_are_let_through_while_redis_is_down(self):
+        self.token_bucket.side_effect = ConnectionError
+        with self.assertLogs("tenants.limits", "WARNING"):
+            self.assertEqual(self.limiter.acquire(self.tenant), (None, None))
+
+
+class TenantExportTests(TenantAPITestCase):
+    def setUp(self):
+        user = User.objects.create(email="member@example.com", first_name="Mem", last_name="Ber")
+        user.tenant.add(self.tenant)
+        for name in ("VIEWER", "EDITOR", "OWNER"):
+            Role.objects.create(name=name)
+
+    def export(self):
+        return [json.loads(line) for line in export_tenant(self.tenant, chunk_size=2)]
+
+    def test_streams_every_row_between_header_and_footer(self):
+        for disable_cursors in (False, True):
+            with mock.patch.dict(connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": disable_cursors}):
+                records = self.export()
+            self.assertEqual(records[0]["data"]["schema_name"], self.tenant.schema_name)
+            roles = [record["data"]["name"] for record in records if record["type"] == "role"]
+            self.assertEqual(roles, ["VIEWER", "EDITOR", "OWNER"])
+            members = [record["data"]["email"] for record in records if record["type"] == "membership"]
+            self.assertEqual(members, ["member@example.com"])
+            counts = records[-1]["data"]["counts"]
+            self.assertEqual((counts["role"], counts["membership"]), (3, 1))
+
+
+@override_settings(TENANT_TEARDOWN_BATCH_SIZE=2, TENANT_TEARDOWN_BATCH_PAUSE=0)
+class TenantTeardownTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant(schema_name="leaving", name="Leaving", admin_email="admin@example.com")
+        self.tenant.auto_create_schema = False
+        self.tenant.save()
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE SCHEMA leaving")
+            cursor.execute("CREATE TABLE leaving.first (id int)")
+            cursor.execute("CREATE TABLE leaving.second (id int)")
+        for i in range(3):
+            Invitation.custom_manager.create_invitation(email=f"invitee{i}@example.com", tenant=self.tenant)
+            user = User.objects.create(email=f"member{i}@example.com", first_name="Mem", last_name="Ber")
+            user.tenant.add(self.tenant)
+
+    def test_tenant_is_removed_in_batches(self):
+        record, created = teardown.start(self.tenant, None)
+        self.assertTrue(created)
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.tenant_status, StatusChoices.INACTIVE)
+
+        teardown.run(record)
+
+        record.refresh_from_db()
+        self.assertEqual(record.status, ProvisioningStatus.SUCCEEDED)
+        self.assertEqual(record.stages["delete_invitations"]["deleted"], 3)
+        self.assertEqual(record.stages["delete_memberships"]["deleted"], 3)
+        self.assertEqual(record.stages["drop_schema"]["dropped_tables"], 2)
+        self.assertFalse(schema_exists("leaving"))
+        self.assertFalse(Tenant.objects.filter(schema_name="leaving").exists())
+        self.assertEqual(User.objects.count(), 3)
+
+
+@override_settings(TENANT_TEARDOWN_LOCK_RETRIES=2, TENANT_TEARDOWN_BATCH_PAUSE=0)
+@mock.patch("tenants.teardown._execute")
+@mock.patch("tenants.teardown.transaction.atomic")
+class TeardownLockRetryTests(SimpleTestCase):
+    def test_lock_timeouts_are_retried(self, atomic, execute):
+        operation = mock.Mock(side_effect=[OperationalError, OperationalError, None])
+        teardown._retrying(operation)
+        self.assertEqual(operation.call_count, 3)
+        execute.assert_called_with("SET LOCAL lock_timeout = %s", ["2000ms"])
+
+    def test_gives_up_after_the_last_retry(self, atomic, execute):
+        operation = mock.Mock(side_effect=OperationalError)
+        with self.assertRaises(OperationalError):
+            teardown._retrying(operation)
+        self.assertEqual(operation.call_count, 3)
+
+
+@mock.patch("tenants.analytics._alias", return_value="default")
+class AnalyticsFanOutTests(SimpleTestCase):
+    def test_rows_of_every_chunk_are_yielded(self, _):
+        chunks = []
+
+        def run_chunk(alias, sql, params, schema_names):
+            chunks.append(schema_names)
+            return [{"schema_name": schema_name, "users": 1} for schema_name in schema_names]
+
+        schema_names = [f"tenant_{i}" for i in range(7)]
+        with mock.patch("tenants.analytics._run_chunk", side_effect=run_chunk):
+            rows = list(analytics.fan_out("SELECT 1", schema_names=schema_names, chunk_size=3, workers=2))
+
+        self.assertEqual(sorted(map(len, chunks)), [1, 3, 3])
+        self.assertEqual(sorted(row["schema_name"] for row in rows), schema_names)
+        lines = list(analytics.ndjson(rows[:1]))
+        self.assertEqual(json.loads(lines[0]), rows[0])
+
+    def test_errors_reach_the_caller(self, _):
+        with mock.patch("tenants.analytics._run_chunk", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                list(analytics.fan_out("SELECT 1", schema_names=["a", "b"], chunk_size=1, workers=1))
@@ -2,7 +2,12 @@ from django.urls import path, include
 
 from tenants.views import (
     AcceptInvitationAPI,
+    TenantAnalyticsAPIView,
     TenantCreateAPIView,
+    TenantExportAPIView,
+    TenantProvisioningAPIView,
+    TenantTeardownAPIView,
+    TenantTeardownCreateAPIView,
     InviteUserAPIView,
     InvitationAPIView,
     UpdateInvitationAPIView
@@ -10,6 +15,11 @@ from tenants.views import (
 
 urlpatterns = [
     path('', TenantCreateAPIView.as_view()),
+    path('provisioning/<uuid:pk>/', TenantProvisioningAPIView.as_view(), name='tenant-provisioning'),
+    path('teardown/', TenantTeardownCreateAPIView.as_view()),
+    path('teardown/<uuid:pk>/', TenantTeardownAPIView.as_view(), name='tenant-teardown'),
+    path('export/', TenantExportAPIView.as_view(), name='tenant-export'),
+    path('analytics/<str:name>/', TenantAnalyticsAPIView.as_view(), name='tenant-analytics'),
     path('invite/', InviteUserAPIView.as_view()),
     path('invite/pending',InvitationAPIView.as_view()),
     path('invite/accept/manual/<str:token>/', UpdateInvitationAPIView.as_view(), name='invitation-update'),
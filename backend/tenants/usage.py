@@ -0,0 +1,199 @@
+import atexit
+import logging
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from tenants.cache import get_tenant_by_schema
+from tenants.models import TenantUsage
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the request latency histogram buckets;
+# the last bucket counts everything slower.
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNTERS = ("requests", "db_time_us", "response_bytes", "latency_us")
+FIELDS = COUNTERS + tuple(f"le_{bound}" for bound in LATENCY_BUCKETS) + ("le_inf",)
+PENDING_KEY = "usage:pending"
+
+# Seconds spent in SQL by the current request; see time_queries().
+db_time = ContextVar("usage_db_time", default=None)
+
+
+def time_queries(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection, timing the metered request's queries."""
+    spent = db_time.get()
+    if spent is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        spent[0] += time.perf_counter() - started
+
+
+def _bucket(latency_ms):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency_ms <= bound:
+            return len(COUNTERS) + i
+    return len(FIELDS) - 1
+
+
+class _Buffer:
+    # Counts recorded by one thread, keyed by (hour, schema_name).
+    __slots__ = ("lock", "counts", "thread")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.thread = threading.current_thread()
+
+
+class UsageMeter:
+    """
+    Per-tenant request counts, DB time, response bytes and a latency histogram.
+
+    Each thread adds to a buffer only it writes to, under a lock that is only
+    ever contended by the flusher, and does no I/O. Every ``flush_interval``
+    seconds, and at exit, a daemon thread swaps out every thread's buffer and
+    adds the merged counts to per-tenant, per-hour Redis hashes in one
+    pipeline, so idle threads don't hold on to counts. Requests are counted
+    in the hour they were served. rollup() later moves those hashes into
+    TenantUsage rows.
+    """
+
+    def __init__(self, flush_interval=10.0):
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._buffers = []
+        self._unsent = {}
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def record(self, schema_name, latency, db_seconds, response_bytes):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._register()
+        key = (self._hour(), schema_name)
+        with buffer.lock:
+            row = buffer.counts.get(key)
+            if row is None:
+                row = buffer.counts[key] = [0] * len(FIELDS)
+            row[0] += 1
+            row[1] += int(db_seconds * 1_000_000)
+            row[2] += response_bytes
+            row[3] += int(latency * 1_000_000)
+            row[_bucket(latency * 1000)] += 1
+
+    def _register(self):
+        buffer = self._local.buffer = _Buffer()
+        with self._lock:
+            self._buffers.append(buffer)
+        self._ensure_flusher()
+        return buffer
+
+    @staticmethod
+    def _hour():
+        return int(time.time()) // 3600 * 3600
+
+    def _drain(self):
+        with self._lock:
+            buffers = self._buffers
+            # Buffers of finished threads are drained one last time below.
+            self._buffers = [buffer for buffer in buffers if buffer.thread.is_alive()]
+            merged, self._unsent = self._unsent, {}
+        for buffer in buffers:
+            with buffer.lock:
+                counts, buffer.counts = buffer.counts, {}
+            for key, row in counts.items():
+                total = merged.setdefault(key, [0] * len(FIELDS))
+                for i, value in enumerate(row):
+                    total[i] += value
+        return merged
+
+    def flush(self):
+        merged = self._drain()
+        if not merged:
+            return 0
+        ttl = getattr(settings, "USAGE_REDIS_TTL", 2 * 24 * 3600)
+        try:
+            # MULTI/EXEC, so a failed flush applied nothing and can be retried.
+            pipe = get_redis_connection("default").pipeline(transaction=True)
+            for (hour, schema_name), row in merged.items():
+                key = f"usage:{hour}:{schema_name}"
+                for field, value in zip(FIELDS, row):
+                    if value:
+                        pipe.hincrby(key, field, value)
+                pipe.expire(key, ttl)
+                pipe.sadd(PENDING_KEY, key)
+            pipe.execute()
+        except Exception:
+            logger.exception("Failed to flush usage of %d tenant-hours, retrying next flush", len(merged))
+            with self._lock:
+                for key, row in merged.items():
+                    total = self._unsent.setdefault(key, [0] * len(FIELDS))
+                    for i, value in enumerate(row):
+                        total[i] += value
+            return 0
+        return len(merged)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name="usage-meter", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def rollup(limit=1000):
+    """
+    Adds the usage hashes flushed to Redis into TenantUsage rows. Each hash is
+    renamed before it is read, so increments that arrive meanwhile go to a
+    fresh hash and are picked up by the next rollup.
+    """
+    redis = get_redis_connection("default")
+    rolled = 0
+    for key in redis.spop(PENDING_KEY, limit) or []:
+        key = key.decode()
+        claimed = f"{key}:rollup:{uuid.uuid4().hex}"
+        try:
+            redis.rename(key, claimed)
+        except Exception:
+            # Already rolled up and expired, or renamed by another worker.
+            continue
+        values = {field.decode(): int(value) for field, value in redis.hgetall(claimed).items()}
+        _, hour, schema_name = key.split(":", 2)
+        tenant = get_tenant_by_schema(schema_name)
+        if tenant is not None:
+            _add_usage(tenant, datetime.fromtimestamp(int(hour), tz=dt_timezone.utc), values)
+        redis.delete(claimed)
+        rolled += 1
+    return rolled
+
+
+@transaction.atomic
+def _add_usage(tenant, period_start, values):
+    usage, _ = TenantUsage.objects.select_for_update().get_or_create(tenant_id=tenant.pk, period_start=period_start)
+    usage.requests += values.get("requests", 0)
+    usage.db_time_ms += values.get("db_time_us", 0) / 1000
+    usage.response_bytes += values.get("response_bytes", 0)
+    usage.latency_ms += values.get("latency_us", 0) / 1000
+    for field in FIELDS[len(COUNTERS):]:
+        usage.latency_histogram[field] = usage.latency_histogram.get(field, 0) + values.get(field, 0)
+    usage.save()
+
+
+usage_meter = UsageMeter(flush_interval=getattr(settings, "USAGE_FLUSH_INTERVAL", 10.0))
+atexit.register(usage_meter.flush)
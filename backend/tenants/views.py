@@ -1,27 +1,34 @@
 import os
 
-from django.contrib.auth.models import Permission
-from django.core.management import call_command
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from django.db import IntegrityError, transaction
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
 from django.utils.encoding import smart_str
 from django.utils.http import urlsafe_base64_decode
-from django_tenants.utils import schema_context
 from rest_framework import permissions, status
 from rest_framework.exceptions import NotFound
-from rest_framework.generics import ListCreateAPIView
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from authentication.utils import Util
-from tenants.models import Invitation, Tenant
+from tenant_permissions.permissions import HasRole
+from tenants.analytics import QUERIES, ndjson
+from tenants.export import CONTENT_TYPE, export_tenant
+from tenants import teardown
+from tenants.models import Invitation, Tenant, TenantProvisioning, TenantTeardown
 from tenants.serializers import (
     InvitationSerializer,
     InvitationUpdateSerializer,
+    TenantProvisioningSerializer,
     TenantSerializer,
+    TenantTeardownSerializer,
 )
+from tenants.seeding import TENANT_ADMIN_ROLE
+from tenants.tasks import provision_tenant, teardown_tenant
 from tenants.utils import Utils
-from tenant_permissions.models import Role, UserRoles
 
 
 class CustomRedirect(HttpResponseRedirect):
@@ -32,16 +39,19 @@ class TenantCreateAPIView(ListCreateAPIView):
     serializer_class = TenantSerializer
     queryset = Tenant.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
+    keyset_ordering = "-id"
 
     def get_queryset(self):
-        return self.request.user.tenant.all()
+        return Tenant.objects.filter(user__pk=self.request.user.pk)
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
+        # Only records the tenant; its schema is built by provision_tenant,
+        # whose progress is reported by TenantProvisioningAPIView.
         serializer = TenantSerializer(data=request.data)
 
         if serializer.is_valid():
-            saved_tenant = serializer.save(admin_email=self.request.user)
+            saved_tenant = serializer.save(admin_email=self.request.user.email)
             savedInvitation = Invitation.custom_manager.create_invitation(
                 email=request.user.email, tenant=saved_tenant
             )
@@ -66,45 +76,107 @@ class TenantCreateAPIView(ListCreateAPIView):
                 "information_message": "Button not working? Copy and paste this link into your browser:",
             }
 
-            Util.send_email(data)
-
-            with schema_context(saved_tenant.schema_name):
-                tenant_admin_role, created = Role.objects.get_or_create(
-                    name="TENANT_ADMIN"
-                )
-                permissions = Permission.objects.filter(
-                    codename__in=["can_change_tenant_info"]
-                )
-                tenant_admin_role.permissions.add(*permissions)
-                user_roles, _ = UserRoles.objects.get_or_create(user=request.user)
-                user_roles.roles.add(tenant_admin_role)
-                user_roles.save()
-                call_command("loaddata", "asset_type.json")
-                call_command("loaddata", "complience_options.json")
+            tenant_provisioning = TenantProvisioning.objects.create(
+                tenant=saved_tenant,
+                requested_by_id=request.user.pk,
+                payload={
+                    "invitation_email": data,
+                    "from_pool": getattr(saved_tenant, "from_pool", False),
+                },
+            )
+            transaction.on_commit(
+                lambda: provision_tenant.delay(str(tenant_provisioning.pk))
+            )
             return Response(
                 {
-                    "data": f"we have sent you an invitation with the information.",
+                    "data": "we will send you an invitation once the tenant is ready.",
                     "tenant": serializer.data,
+                    "provisioning": TenantProvisioningSerializer(tenant_provisioning).data,
+                    "status_url": request.build_absolute_uri(
+                        reverse("tenant-provisioning", kwargs={"pk": tenant_provisioning.pk})
+                    ),
                 },
-                status=status.HTTP_201_CREATED,
+                status=status.HTTP_202_ACCEPTED,
             )
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class InviteUserAPIView(APIView):
+class TenantProvisioningAPIView(RetrieveAPIView):
+    serializer_class = TenantProvisioningSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return TenantProvisioning.objects.select_related("tenant").filter(
+            requested_by_id=self.request.user.pk
+        )
+
+
+class TenantTeardownCreateAPIView(APIView):
+    permission_classes = [HasRole([TENANT_ADMIN_ROLE]),]
+
+    @transaction.atomic
+    def post(self, request):
+        # The tenant stops serving requests now; its data and schema are
+        # removed by teardown_tenant, whose progress TenantTeardownAPIView reports.
+        try:
+            tenant_teardown, created = teardown.start(request.tenant, request.user.pk)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if created:
+            transaction.on_commit(lambda: teardown_tenant.delay(str(tenant_teardown.pk)))
+        return Response(
+            {
+                "teardown": TenantTeardownSerializer(tenant_teardown).data,
+                "status_url": request.build_absolute_uri(
+                    reverse("tenant-teardown", kwargs={"pk": tenant_teardown.pk})
+                ),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class TenantTeardownAPIView(RetrieveAPIView):
+    serializer_class = TenantTeardownSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return TenantTeardown.objects.filter(requested_by_id=self.request.user.pk)
+
+
+class TenantExportAPIView(APIView):
+    permission_classes = [HasRole([TENANT_ADMIN_ROLE]),]
+
+    def get(self, request):
+        tenant = request.tenant
+        response = StreamingHttpResponse(export_tenant(tenant), content_type=CONTENT_TYPE)
+        response["Content-Disposition"] = f'attachment; filename="{tenant.schema_name}.ndjson"'
+        return response
+
+
+class TenantAnalyticsAPIView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, name):
+        query = QUERIES.get(name)
+        if query is None:
+            raise NotFound(f"Unknown query. Choose one of: {', '.join(sorted(QUERIES))}.")
+        return StreamingHttpResponse(ndjson(query()), content_type=CONTENT_TYPE)
+
+
+class InviteUserAPIView(AsyncAPIView):
     serializer_class = InvitationSerializer
     queryset = Invitation.custom_manager.all()
 
-    def post(self, request):
+    async def post(self, request):
         serializer = self.serializer_class(data=request.data)
         redirect_url = request.data.get("redirect_url", "")
         fallback_url = request.data.get("fallback_url", "")
 
-        if serializer.is_valid():
+        if await sync_to_async(serializer.is_valid)():
             try:
                 tenant = self.request.tenant
-                saved_invitation = serializer.save(tenant=tenant)
+                saved_invitation = await sync_to_async(serializer.save)(tenant=tenant)
 
                 invitation_url = Utils.generate_invitation_url(
                     request=request,
@@ -125,7 +197,7 @@ class InviteUserAPIView(APIView):
                     "information_message": "Button not working? Copy and paste this link into your browser:",
                 }
 
-                Util.send_email(data)
+                await sync_to_async(Util.send_email)(data)
                 return Response(data=response_data, status=status.HTTP_201_CREATED)
 
             except IntegrityError:
@@ -163,19 +235,15 @@ class AcceptInvitationAPI(APIView):
             return CustomRedirect(f"{fallback_url}?token_valid=False&exception={e}")
 
 
-class InvitationAPIView(APIView):
+class InvitationAPIView(ListAPIView):
     serializer_class = InvitationSerializer
+    keyset_ordering = "-id"
 
     def get_queryset(self):
-        return Invitation.custom_manager.filter(
+        return Invitation.custom_manager.select_related("tenant").filter(
             email=self.request.user.email, is_accepted=False
         )
 
-    def get(self, request):
-        invitations = self.get_queryset()
-        serializer = self.serializer_class(invitations, many=True)
-        return Response(serializer.data)
-
 
 class UpdateInvitationAPIView(APIView):
     serializer_class = InvitationUpdateSerializer